@@ -101,6 +101,22 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+
+# Cached reads are invalidated by version keys, so every worker must share
+# one backend (e.g. Redis or Memcached); the local-memory default only suits
+# a single process.
+CACHES = {
+    "default": {
+        "BACKEND": env(
+            "CACHE_BACKEND", default="django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": env("CACHE_LOCATION", default="eshop"),
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -144,7 +160,39 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 # REST FRAMEWORK
 REST_FRAMEWORK = {
+    # orjson-backed, falling back to the stdlib json module when not installed
+    "DEFAULT_RENDERER_CLASSES": [
+        "eshop.renderers.ORJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
     "DEFAULT_PARSER_CLASSES": [
-        "rest_framework.parsers.JSONParser",
-    ]
+        "eshop.parsers.ORJSONParser",
+    ],
+    "DEFAULT_PAGINATION_CLASS": "eshop.pagination.IdCursorPagination",
+    "PAGE_SIZE": 100,
 }
+
+# IMPORT
+# Number of rows committed per transaction by the row importer and written per
+# statement by the bulk import mode (?mode=bulk); overridable with ?batch_size=
+IMPORT_BATCH_SIZE = 1000
+# Number of records parsed, validated and written at a time by the streaming
+# import (?stream=1); dependency ordering applies within each chunk
+IMPORT_STREAM_CHUNK_SIZE = 5000
+# Longest single record, in characters, the streaming import buffers before
+# rejecting the body
+IMPORT_STREAM_MAX_ITEM_SIZE = 16 * 1024 * 1024
+# Worker threads processing asynchronous imports (?async=1); 0 runs the job
+# inline once the request commits. Jobs left behind by a stopped worker are
+# re-run by the recover_import_jobs management command
+IMPORT_JOB_WORKERS = 2
+# Skip rows whose payload hash matches the one stored by their last import.
+# Model signals drop the hashes of edited rows; writes through
+# QuerySet.update() or raw SQL bypass them
+IMPORT_FINGERPRINTS = True
+
+# LISTS
+# Rows fetched per database round trip by streamed list exports (?stream=)
+LIST_STREAM_CHUNK_SIZE = 2000
+# Seconds a serialized detail or list page stays in the read cache
+API_CACHE_TIMEOUT = 300
@@ -9,6 +9,8 @@ from .models import (
     Image,
     ProductImage,
     Catalog,
+    ImportJob,
+    ProductDocument,
 )
 
 
@@ -70,3 +72,16 @@ class CatalogAdmin(admin.ModelAdmin):
     list_filter = ("image",)
     raw_id_fields = ("products", "attributes")
     search_fields = ("name",)
+
+
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "status", "total", "processed", "created_on", "finished_on")
+    list_filter = ("status",)
+    exclude = ("payload",)
+
+
+@admin.register(ProductDocument)
+class ProductDocumentAdmin(admin.ModelAdmin):
+    list_display = ("product", "updated_on")
+    raw_id_fields = ("product",)
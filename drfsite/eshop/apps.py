@@ -4,3 +4,16 @@ from django.apps import AppConfig
 class EshopConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'eshop'
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save, pre_delete
+
+        from . import signals
+        from .utils import models
+
+        # One connection per catalogue model: a receiver without a sender
+        # turns off fast deletes for every model
+        for model in models.values():
+            post_save.connect(signals.row_saved, sender=model)
+            pre_delete.connect(signals.row_deleting, sender=model)
+            post_delete.connect(signals.row_deleted, sender=model)
@@ -0,0 +1,153 @@
+import hashlib
+import math
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .utils import models
+
+
+PREFIX = "eshop"
+
+
+def get_version(name: str) -> int:
+    """Return the current generation of a group of cache keys."""
+    key = f"{PREFIX}:version:{name}"
+    version = cache.get(key)
+
+    if version is None:
+        # Start from a timestamp so a cleared cache never reuses stale keys
+        if cache.add(key, time.time_ns(), timeout=None):
+            modified = math.ceil(time.time())
+            cache.set(f"{PREFIX}:modified:{name}", modified, timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(name: str) -> None:
+    try:
+        cache.incr(f"{PREFIX}:version:{name}")
+    except ValueError:
+        cache.set(f"{PREFIX}:version:{name}", time.time_ns(), timeout=None)
+
+    # Last-Modified has whole-second resolution: round up, and move past the
+    # previous value so a write in the same second still reads as newer
+    key = f"{PREFIX}:modified:{name}"
+    modified = max(math.ceil(time.time()), cache.get(key, 0) + 1)
+    cache.set(key, modified, timeout=None)
+
+
+def get_list_versions(model_key: str, dependencies: tuple[str, ...] = ()) -> str:
+    """Join the list generations of a model and of the models it is filtered by."""
+    return ":".join(
+        str(get_version(f"list:{key}")) for key in (model_key, *dependencies)
+    )
+
+
+def get_etag(
+    model_key: str, url: str, accept: str = "", dependencies: tuple[str, ...] = ()
+) -> str:
+    """Derive an entity tag from the model's cache generations, the URL and
+    the requested media type, without touching the database."""
+    versions = (
+        f"{get_list_versions(model_key, dependencies)}"
+        f":{get_version(f'detail:{model_key}')}"
+    )
+    return hashlib.sha1(f"{versions}:{url}:{accept}".encode()).hexdigest()
+
+
+def get_last_modified(
+    model_key: str, dependencies: tuple[str, ...] = ()
+) -> datetime | None:
+    """Return when the model's cached reads, or the lists of the models it
+    is filtered by, were last invalidated."""
+    names = [f"{kind}:{model_key}" for kind in ("list", "detail")]
+    names += [f"list:{key}" for key in dependencies]
+    for name in names:
+        get_version(name)
+
+    timestamps = cache.get_many([f"{PREFIX}:modified:{name}" for name in names])
+    if not timestamps:
+        return None
+    return datetime.fromtimestamp(max(timestamps.values()), tz=timezone.utc)
+
+
+def get_list_cache_key(
+    model_key: str, url: str, dependencies: tuple[str, ...] = ()
+) -> str:
+    """Key a list page by the list generations of the model and of the models
+    its filters read, and the full URL."""
+    url_hash = hashlib.sha1(url.encode()).hexdigest()
+    versions = get_list_versions(model_key, dependencies)
+    return f"{PREFIX}:list:{model_key}:{versions}:{url_hash}"
+
+
+def get_detail_cache_key(
+    model_key: str, pk: int, fields: tuple[str, ...] | None = None
+) -> str:
+    version = get_version(f"detail:{model_key}")
+    if fields is None:
+        return f"{PREFIX}:detail:{model_key}:{version}:{pk}"
+
+    # Projections are not dropped per row, so they follow the list generation
+    list_version = get_version(f"list:{model_key}")
+    projection = ",".join(fields)
+    return f"{PREFIX}:detail:{model_key}:{version}:{list_version}:{pk}:{projection}"
+
+
+def get_cached(cache_key: str):
+    """Read a serialized payload and count the hit or miss."""
+    data = cache.get(cache_key)
+    record_stat("hits" if data is not None else "misses")
+    return data
+
+
+def read_cached(get_key, *args) -> tuple[str, object]:
+    """Build a cache key and read it in one call, so async views can run
+    both off the event loop together."""
+    cache_key = get_key(*args)
+    return cache_key, get_cached(cache_key)
+
+
+def set_cached(cache_key: str, data) -> None:
+    cache.set(cache_key, data, settings.API_CACHE_TIMEOUT)
+
+
+def record_stat(name: str) -> None:
+    key = f"{PREFIX}:stats:{name}"
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
+
+
+def get_stats() -> dict:
+    return {
+        name: cache.get(f"{PREFIX}:stats:{name}", 0) for name in ("hits", "misses")
+    }
+
+
+def invalidate_rows(model_key: str, pks) -> None:
+    """Drop the cached details of the given rows and every cached list page
+    of their model."""
+    cache.delete_many([get_detail_cache_key(model_key, pk) for pk in pks])
+    bump_version(f"list:{model_key}")
+
+
+def invalidate_model(model_key: str) -> None:
+    bump_version(f"detail:{model_key}")
+    bump_version(f"list:{model_key}")
+
+
+def invalidate_m2m_dependents(model_key: str) -> None:
+    """Deleting a row silently removes its many-to-many links, so drop the
+    cache of every model that lists it through such a relation."""
+    for key, model in models.items():
+        if any(
+            field.related_model.__name__ == model_key
+            for field in model._meta.many_to_many
+        ):
+            invalidate_model(key)
@@ -0,0 +1,149 @@
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Catalog, Product, ProductAttributes, ProductDocument, ProductImage
+from .utils import get_registry_entry
+
+
+# Where the product id of the rows of each catalogue model is found, read
+# from the link tables so no product rows are joined
+PRODUCT_LOOKUPS = {
+    "Product": (Product, "pk__in", "pk"),
+    "ProductAttributes": (ProductAttributes, "pk__in", "product_id"),
+    "ProductImage": (ProductImage, "pk__in", "product_id"),
+    "Attribute": (ProductAttributes, "attribute__in", "product_id"),
+    "AttributeName": (
+        ProductAttributes,
+        "attribute__attribute_name__in",
+        "product_id",
+    ),
+    "AttributeValue": (
+        ProductAttributes,
+        "attribute__attribute_value__in",
+        "product_id",
+    ),
+    "Image": (ProductImage, "image__in", "product_id"),
+    "Catalog": (Catalog.products.through, "catalog__in", "product_id"),
+}
+
+
+# Set while an importer writes rows; it rebuilds the documents in batches itself
+refresh_deferred = ContextVar("refresh_deferred", default=False)
+
+
+@contextmanager
+def defer_document_refresh():
+    token = refresh_deferred.set(True)
+    try:
+        yield
+    finally:
+        refresh_deferred.reset(token)
+
+
+def get_affected_products(model_key: str, ids) -> set[int]:
+    """Return the ids of the products whose document includes the given rows."""
+    model, lookup, column = PRODUCT_LOOKUPS[model_key]
+    return set(model.objects.filter(**{lookup: ids}).values_list(column, flat=True))
+
+
+def build_product_documents(product_ids) -> dict[int, dict]:
+    """Serialize products together with their attributes, images and catalogs,
+    reading each relation for the whole batch in one query."""
+    attributes, images, catalogs = (defaultdict(list) for _ in range(3))
+
+    for product_id, pk, name, value in (
+        ProductAttributes.objects.filter(product__in=product_ids)
+        .order_by("id")
+        .values_list(
+            "product_id",
+            "attribute_id",
+            "attribute__attribute_name__name",
+            "attribute__attribute_value__value",
+        )
+    ):
+        attributes[product_id].append({"id": pk, "nazev": name, "hodnota": value})
+
+    for product_id, pk, name, url in (
+        ProductImage.objects.filter(product__in=product_ids)
+        .order_by("id")
+        .values_list("product_id", "id", "name", "image__image")
+    ):
+        images[product_id].append({"id": pk, "nazev": name, "obrazek": url})
+
+    for product_id, pk, name in (
+        Catalog.products.through.objects.filter(product__in=product_ids)
+        .order_by("catalog_id")
+        .values_list("product_id", "catalog_id", "catalog__name")
+    ):
+        catalogs[product_id].append({"id": pk, "nazev": name})
+
+    documents = {}
+    plan = get_registry_entry("Product").get_read_plan()
+    products = plan.values(Product.objects.filter(pk__in=product_ids))
+    for document in plan.render(products):
+        document["attributes"] = attributes[document["id"]]
+        document["images"] = images[document["id"]]
+        document["catalogs"] = catalogs[document["id"]]
+        documents[document["id"]] = document
+
+    return documents
+
+
+def get_search_text(document: dict) -> str:
+    """Join the searchable parts of a document: name, description and the
+    attribute values."""
+    values = [attribute["hodnota"] for attribute in document["attributes"]]
+    return " ".join([document["nazev"], document["description"], *values])
+
+
+def store_product_documents(documents: dict[int, dict]) -> None:
+    ProductDocument.objects.bulk_create(
+        [
+            ProductDocument(
+                product_id=pk, document=document, search_text=get_search_text(document)
+            )
+            for pk, document in documents.items()
+        ],
+        update_conflicts=True,
+        unique_fields=["product"],
+        update_fields=["document", "search_text", "updated_on"],
+    )
+
+
+def refresh_product_documents(product_ids) -> None:
+    """Rebuild and upsert the documents of the given products in batches."""
+    product_ids = sorted(product_ids)
+
+    for start in range(0, len(product_ids), settings.IMPORT_BATCH_SIZE):
+        batch = product_ids[start : start + settings.IMPORT_BATCH_SIZE]
+        store_product_documents(build_product_documents(batch))
+
+
+def get_product_document(pk: int) -> dict | None:
+    """Read a product document, building it on first access."""
+    document = (
+        ProductDocument.objects.filter(product_id=pk)
+        .values_list("document", flat=True)
+        .first()
+    )
+
+    if document is None:
+        documents = build_product_documents([pk])
+        store_product_documents(documents)
+        document = documents.get(pk)
+
+    return document
+
+
+def schedule_document_refresh(product_ids) -> None:
+    """Rebuild the documents once the surrounding transaction commits, so
+    deletions have cascaded and deleted products are left out."""
+    if refresh_deferred.get() or not product_ids:
+        return
+
+    product_ids = set(product_ids)
+    transaction.on_commit(lambda: refresh_product_documents(product_ids))
@@ -0,0 +1,172 @@
+from django.db.models import Count
+from django.db.models.query import QuerySet
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+
+from .models import ProductAttributes
+
+
+class Filter:
+    """Map a query parameter onto a queryset lookup.
+
+    Multi-valued relations are matched through a semi-join on the primary key,
+    so a row linked several times still appears once in the result."""
+
+    def __init__(self, lookup: str, field: serializers.Field, related: bool = False):
+        self.lookup = lookup
+        self.field = field
+        self.related = related
+
+    def parse(self, param: str, value: str):
+        try:
+            return self.field.run_validation(value)
+        except serializers.ValidationError as exc:
+            raise ValidationError({param: exc.detail})
+
+
+def get_price_field() -> serializers.DecimalField:
+    return serializers.DecimalField(max_digits=8, decimal_places=2)
+
+
+MODEL_FILTERS = {
+    "Product": {
+        "is_published": Filter("is_published", serializers.BooleanField()),
+        "currency": Filter("currency", serializers.CharField(max_length=3)),
+        "published_on__gte": Filter("published_on__gte", serializers.DateTimeField()),
+        "published_on__lte": Filter("published_on__lte", serializers.DateTimeField()),
+        "price__gte": Filter("price__gte", get_price_field()),
+        "price__lte": Filter("price__lte", get_price_field()),
+        "catalog": Filter("catalogue", serializers.IntegerField(), related=True),
+        "attribute_name": Filter(
+            "product_attribute__attribute__attribute_name__name",
+            serializers.CharField(),
+            related=True,
+        ),
+        "attribute_value": Filter(
+            "product_attribute__attribute__attribute_value__value",
+            serializers.CharField(),
+            related=True,
+        ),
+    },
+    "Attribute": {
+        "attribute_name": Filter("attribute_name", serializers.IntegerField()),
+        "attribute_value": Filter("attribute_value", serializers.IntegerField()),
+    },
+    "ProductAttributes": {
+        "product": Filter("product", serializers.IntegerField()),
+        "attribute": Filter("attribute", serializers.IntegerField()),
+    },
+}
+
+# Only non-null columns: cursor positions cannot be built from NULL values
+ORDERING_FIELDS = {
+    "Product": ("id", "name", "price", "currency", "is_published"),
+    "Attribute": ("id", "attribute_name_id", "attribute_value_id"),
+    "ProductAttributes": ("id", "product_id", "attribute_id"),
+}
+
+
+def filter_queryset(queryset: QuerySet, query_params) -> QuerySet:
+    """Narrow the queryset down with the filters declared for its model."""
+    filters = MODEL_FILTERS.get(queryset.model.__name__, {})
+    lookups, related_lookups = {}, {}
+
+    for param, model_filter in filters.items():
+        if param not in query_params:
+            continue
+        value = model_filter.parse(param, query_params[param])
+        target = related_lookups if model_filter.related else lookups
+        target[model_filter.lookup] = value
+
+    if lookups:
+        queryset = queryset.filter(**lookups)
+
+    # One filter() call, so attribute name and value must match the same link
+    if related_lookups:
+        matching = queryset.model.objects.filter(**related_lookups).values("pk")
+        queryset = queryset.filter(pk__in=matching)
+
+    return queryset
+
+
+def get_filter_dependencies(model, query_params) -> tuple[str, ...]:
+    """Return the keys of the other models read by the active filters, whose
+    changes must invalidate the filtered list too."""
+    dependencies = set()
+
+    for param, model_filter in MODEL_FILTERS.get(model.__name__, {}).items():
+        if param not in query_params:
+            continue
+
+        related_model = model
+        for name in model_filter.lookup.split("__"):
+            field = related_model._meta.get_field(name)
+            if not field.is_relation:
+                break
+            related_model = field.related_model
+            dependencies.add(related_model.__name__)
+
+    return tuple(sorted(dependencies))
+
+
+def get_ordering(model_name: str, query_params) -> str:
+    """Return the validated ?ordering= field, defaulting to the primary key."""
+    ordering = query_params.get("ordering", "id")
+    allowed = ORDERING_FIELDS.get(model_name, ("id",))
+
+    if ordering.lstrip("-") not in allowed:
+        raise ValidationError(
+            {"ordering": f"Choose from: {', '.join(allowed)} (prefix '-' to reverse)."}
+        )
+
+    return ordering
+
+
+def get_order_by(ordering: str) -> tuple[str, ...]:
+    """Break ties on the primary key, in the same direction, so the row order
+    is total and the cursor can compare (value, id) pairs."""
+    if ordering.lstrip("-") == "id":
+        return (ordering,)
+    return (ordering, "-id" if ordering.startswith("-") else "id")
+
+
+def order_queryset(queryset: QuerySet, ordering: str) -> QuerySet:
+    return queryset.order_by(*get_order_by(ordering))
+
+
+def get_attribute_facets(products: QuerySet) -> list[dict]:
+    """Count the matching products per attribute value in one grouped query
+    over the product-attribute links."""
+    rows = (
+        ProductAttributes.objects.filter(product__in=products.values("pk"))
+        .values(
+            "attribute__attribute_name_id",
+            "attribute__attribute_name__name",
+            "attribute__attribute_value_id",
+            "attribute__attribute_value__value",
+        )
+        .annotate(count=Count("product", distinct=True))
+        .order_by(
+            "attribute__attribute_name__name", "attribute__attribute_value__value"
+        )
+    )
+    facets = {}
+
+    for row in rows:
+        facet = facets.setdefault(
+            row["attribute__attribute_name_id"],
+            {
+                "attribute_name": row["attribute__attribute_name_id"],
+                "name": row["attribute__attribute_name__name"],
+                "values": [],
+            },
+        )
+        facet["values"].append(
+            {
+                "attribute_value": row["attribute__attribute_value_id"],
+                "value": row["attribute__attribute_value__value"],
+                "count": row["count"],
+            }
+        )
+
+    return list(facets.values())
@@ -0,0 +1,641 @@
+import hashlib
+import json
+from collections import Counter, defaultdict
+from itertools import islice
+
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Model, prefetch_related_objects
+from rest_framework.relations import ManyRelatedField, PrimaryKeyRelatedField
+from rest_framework.serializers import ModelSerializer
+from rest_framework.utils.encoders import JSONEncoder
+
+from .cache import invalidate_rows
+from .documents import (
+    PRODUCT_LOOKUPS,
+    defer_document_refresh,
+    get_affected_products,
+    refresh_product_documents,
+)
+from .models import ImportFingerprint
+from .utils import IMPORT_ORDER, get_registry_entry, get_serializer_model
+
+
+# Unique columns a record is matched on in natural key mode, by model key
+NATURAL_KEYS = {
+    "AttributeName": "name",
+    "AttributeValue": "value",
+    "Image": "image",
+    "Product": "name",
+}
+
+
+def chunked(items, size: int):
+    """Split an iterable into consecutive lists of the given size."""
+    iterator = iter(items)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def get_changed_fields(instance: Model, validated_data: dict) -> list[str]:
+    """Return the fields whose validated value differs from the instance.
+    Many-to-many fields are compared against the prefetched related ids."""
+    changed = []
+
+    for name, value in validated_data.items():
+        field = instance._meta.get_field(name)
+
+        if field.many_to_many:
+            if instance._state.adding or {obj.pk for obj in value} != {
+                obj.pk for obj in getattr(instance, name).all()
+            }:
+                changed.append(name)
+            continue
+
+        current = getattr(instance, field.attname)
+        new = value.pk if field.is_relation and value is not None else value
+
+        if current != new:
+            changed.append(name)
+
+    return changed
+
+
+def get_payload_id(object_data) -> int | None:
+    """Return the integer id of a raw record, if it has one."""
+    if not isinstance(object_data, dict):
+        return None
+
+    pk = object_data.get("id")
+    return pk if isinstance(pk, int) and not isinstance(pk, bool) else None
+
+
+def get_payload_digest(object_data) -> str:
+    """Hash a raw record independently of its key order."""
+    payload = json.dumps(object_data, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def store_fingerprints(key: str, digests: dict) -> None:
+    """Upsert the payload hashes of the rows an import has written."""
+    ImportFingerprint.objects.bulk_create(
+        [
+            ImportFingerprint(model_name=key, object_id=pk, digest=digest)
+            for pk, digest in digests.items()
+            if pk is not None
+        ],
+        update_conflicts=True,
+        unique_fields=["model_name", "object_id"],
+        update_fields=["digest"],
+        batch_size=settings.IMPORT_BATCH_SIZE,
+    )
+
+
+def forget_fingerprints(key: str, ids=None) -> None:
+    """Make the next import of these rows compare them again."""
+    fingerprints = ImportFingerprint.objects.filter(model_name=key)
+    if ids is not None:
+        fingerprints = fingerprints.filter(object_id__in=ids)
+    fingerprints.delete()
+
+
+def iter_ndjson_report(result: dict):
+    """Yield a summary report as NDJSON: one line per failed record followed
+    by a line with the per-model counts."""
+    lines = [
+        *result["invalid_data"],
+        {"summary": result["summary"], "unknown_models": result["unknown_models"]},
+    ]
+
+    for line in lines:
+        yield json.dumps(
+            line, cls=JSONEncoder, ensure_ascii=False, separators=(",", ":")
+        ) + "\n"
+
+
+def get_related_objects(
+    serializer_class: ModelSerializer, key: str, records: list
+) -> dict:
+    """Collect every primary key the records reference and resolve them with
+    one in_bulk per target model."""
+    related_ids = defaultdict(set)
+
+    for name, field in serializer_class().fields.items():
+        if isinstance(field, ManyRelatedField):
+            field, many = field.child_relation, True
+        elif isinstance(field, PrimaryKeyRelatedField):
+            many = False
+        else:
+            continue
+
+        model = field.queryset.model
+        for data in records:
+            values = data[key].get(name) if isinstance(data[key], dict) else None
+            if values is None:
+                continue
+
+            for value in values if many and isinstance(values, list) else [values]:
+                try:
+                    related_ids[model].add(model._meta.pk.to_python(value))
+                except (TypeError, DjangoValidationError):
+                    continue
+
+    return {
+        model: model._default_manager.in_bulk(ids)
+        for model, ids in related_ids.items()
+    }
+
+
+def get_reference_fields(serializer_class: ModelSerializer) -> list[tuple[str, str]]:
+    """List the payload fields holding primary keys, with the model key of
+    the rows they point at."""
+    references = []
+
+    for name, field in serializer_class().fields.items():
+        if isinstance(field, ManyRelatedField):
+            field = field.child_relation
+        elif not isinstance(field, PrimaryKeyRelatedField):
+            continue
+        references.append((name, field.queryset.model.__name__))
+
+    return references
+
+
+class ModelImporter:
+    """Import records bucket by bucket in foreign key dependency order.
+
+    With report="summary" the saved records are only counted per model and
+    failures are reported by model, id and error instead of being echoed.
+
+    With natural_keys=True records of the NATURAL_KEYS models are matched on
+    their unique column: a value that already exists under another id
+    updates that row, and references to the sent id in later buckets are
+    remapped to it.
+    """
+
+    def __init__(
+        self,
+        batch_size: int | None = None,
+        report: str = "full",
+        progress=None,
+        natural_keys: bool = False,
+    ):
+        self.batch_size = batch_size or settings.IMPORT_BATCH_SIZE
+        self.report = report
+        self.progress = progress
+        self.natural_keys = natural_keys
+        self.id_map = defaultdict(dict)
+        self.remapped = {}
+        self.processed = 0
+        self.written_ids = set()
+        self.changed_ids = defaultdict(set)
+        self.saved_models, self.invalid_data, self.unknown_models = [], [], []
+        self.summary = defaultdict(
+            lambda: {"created": 0, "updated": 0, "unchanged": 0, "invalid": 0}
+        )
+        self.unknown_counts = defaultdict(int)
+
+    def run(self, json_data: list) -> dict:
+        with defer_document_refresh():
+            for key, records in self.plan(json_data):
+                self.import_model(key, records)
+
+        self.refresh_documents()
+        return self.result()
+
+    def run_stream(self, records) -> dict:
+        """Import a lazily parsed payload chunk by chunk. The dependency order
+        applies within each chunk of IMPORT_STREAM_CHUNK_SIZE records."""
+        for chunk in chunked(records, settings.IMPORT_STREAM_CHUNK_SIZE):
+            with defer_document_refresh():
+                for key, bucket in self.plan(chunk):
+                    self.import_model(key, bucket)
+            self.refresh_documents()
+
+        return self.result()
+
+    def refresh_documents(self) -> None:
+        """Rebuild the documents of every product the written rows show up in."""
+        product_ids = set()
+
+        for key, ids in self.changed_ids.items():
+            if key in PRODUCT_LOOKUPS:
+                for chunk in chunked(sorted(ids), self.batch_size):
+                    product_ids |= get_affected_products(key, chunk)
+
+        self.changed_ids.clear()
+        refresh_product_documents(product_ids)
+
+    def report_progress(self) -> None:
+        """Pass the importer to the progress callback after every chunk."""
+        if self.progress is not None:
+            self.progress(self)
+
+    def result(self) -> dict:
+        if self.report == "summary":
+            return {
+                "summary": dict(self.summary),
+                "invalid_data": self.invalid_data,
+                "unknown_models": dict(self.unknown_counts),
+            }
+
+        return {
+            "created_or_updated": self.saved_models,
+            "invalid_data": self.invalid_data,
+            "unknown_models": self.unknown_models,
+        }
+
+    def plan(self, json_data: list) -> list[tuple[str, list]]:
+        """Bucket the incoming records by model and order the buckets so that
+        referenced models are imported before the models pointing at them."""
+        buckets = {}
+
+        for data in json_data:
+            for key in data.keys():
+                if get_serializer_model(key) is None:
+                    self.unknown_counts[key] += 1
+                    self.processed += 1
+                    if self.report != "summary":
+                        self.unknown_models.append(data)
+                    continue
+
+                buckets.setdefault(key, []).append(data)
+
+        return sorted(buckets.items(), key=lambda bucket: IMPORT_ORDER[bucket[0]])
+
+    def record_saved(self, key: str, data: dict, serializer, outcome: str) -> None:
+        self.summary[key][outcome] += 1
+        self.processed += 1
+
+        if outcome != "unchanged":
+            self.written_ids.add(serializer.instance.pk)
+
+        if self.report != "summary":
+            if serializer is not None:
+                data[key] = serializer.data
+            self.saved_models.append(data)
+
+    def record_invalid(self, key: str, data: dict, error) -> None:
+        self.summary[key]["invalid"] += 1
+        self.processed += 1
+
+        if self.report == "summary":
+            object_data = data[key] if isinstance(data[key], dict) else {}
+            self.invalid_data.append(
+                {"model": key, "id": object_data.get("id"), "error": error}
+            )
+        else:
+            data[key]["error"] = error
+            self.invalid_data.append(data)
+
+    def validate(self, key: str, records: list) -> list:
+        """Validate the records of a bucket and return (data, serializer) pairs."""
+        serializer_class = get_serializer_model(key)
+
+        if self.natural_keys:
+            self.remap_references(serializer_class, key, records)
+
+        context = {"related_objects": get_related_objects(serializer_class, key, records)}
+        valid = []
+
+        for data in records:
+            serializer = serializer_class(data=data[key], context=context)
+
+            if not serializer.is_valid():
+                self.record_invalid(key, data, serializer.errors)
+                continue
+
+            valid.append((data, serializer))
+
+        if self.natural_keys and key in NATURAL_KEYS:
+            self.resolve_natural_keys(key, valid)
+
+        return valid
+
+    def remap_references(self, serializer_class, key: str, records: list) -> None:
+        """Point the references of raw records at the rows their ids were
+        resolved to by natural key earlier in the import."""
+        for name, model_key in get_reference_fields(serializer_class):
+            id_map = self.id_map.get(model_key)
+            if not id_map:
+                continue
+
+            for data in records:
+                object_data = data[key]
+                if not isinstance(object_data, dict) or name not in object_data:
+                    continue
+
+                value = object_data[name]
+                if isinstance(value, list):
+                    object_data[name] = [
+                        id_map.get(pk, pk) if isinstance(pk, int) else pk
+                        for pk in value
+                    ]
+                elif isinstance(value, int):
+                    object_data[name] = id_map.get(value, value)
+
+    def resolve_natural_keys(self, key: str, valid: list) -> None:
+        """Swap the sent ids for the ids of the rows that already hold the
+        same unique value, found with one query per bucket, so the writes
+        never conflict on the unique column."""
+        field = NATURAL_KEYS[key]
+        model = get_serializer_model(key).Meta.model
+        values = {
+            serializer.validated_data[field]
+            for _, serializer in valid
+            if field in serializer.validated_data
+        }
+        existing = dict(
+            model.objects.filter(**{f"{field}__in": values}).values_list(field, "id")
+        )
+
+        for data, serializer in valid:
+            value = serializer.validated_data.get(field)
+            if value is None:
+                continue
+
+            # A value repeated in the bucket goes to the first id that sent it
+            pk = serializer.validated_data["id"]
+            target = existing.setdefault(value, pk)
+            if target != pk:
+                serializer.validated_data["id"] = target
+                self.id_map[key][pk] = target
+                self.remapped[id(data)] = target
+
+    def get_instances(self, model, valid: list) -> dict:
+        """Fetch the existing rows of a bucket with their related ids."""
+        m2m_names = [field.name for field in model._meta.many_to_many]
+        return model.objects.prefetch_related(*m2m_names).in_bulk(
+            {serializer.validated_data["id"] for _, serializer in valid}
+        )
+
+    def import_model(self, key: str, records: list) -> None:
+        """Import a bucket batch_size records at a time, reporting the
+        progress after every committed chunk."""
+        if settings.IMPORT_FINGERPRINTS:
+            digests = {id(data): get_payload_digest(data[key]) for data in records}
+            records = self.skip_unchanged(key, records, digests)
+
+        # Every record was unchanged, the skipped ones still count as processed
+        if not records:
+            self.report_progress()
+
+        for chunk in chunked(records, self.batch_size):
+            self.written_ids, self.remapped = set(), {}
+            saved = self.write_model(key, chunk)
+
+            # Remapped records were written under another id than they carry,
+            # the row they went to no longer matches its own last payload
+            if settings.IMPORT_FINGERPRINTS:
+                targets = [
+                    self.remapped[id(data)]
+                    for data in saved
+                    if id(data) in self.remapped
+                ]
+                if targets:
+                    forget_fingerprints(key, targets)
+                store_fingerprints(
+                    key,
+                    {
+                        get_payload_id(data[key]): digests[id(data)]
+                        for data in saved
+                        if id(data) not in self.remapped
+                    },
+                )
+
+            # Bulk writes send no model signals, so drop the cached reads here
+            if self.written_ids:
+                invalidate_rows(key, self.written_ids)
+                self.changed_ids[key] |= self.written_ids
+
+            self.report_progress()
+
+    def skip_unchanged(self, key: str, records: list, digests: dict) -> list:
+        """Report the records whose payload hash matches the fingerprint of
+        the last import of that row as unchanged, without validating or
+        reading the row, and return the remaining records."""
+        ids = Counter(get_payload_id(data[key]) for data in records)
+        stored = dict(
+            ImportFingerprint.objects.filter(
+                model_name=key, object_id__in=[pk for pk in ids if pk is not None]
+            ).values_list("object_id", "digest")
+        )
+        unchanged, remaining = [], []
+
+        for data in records:
+            pk = get_payload_id(data[key])
+
+            # A row sent several times is imported so the last record wins
+            if pk is not None and ids[pk] == 1 and stored.get(pk) == digests[id(data)]:
+                unchanged.append(data)
+                continue
+
+            remaining.append(data)
+
+        if self.report != "summary":
+            missing = self.render_unchanged(key, unchanged)
+            missing_ids = {id(data) for data in missing}
+            unchanged = [data for data in unchanged if id(data) not in missing_ids]
+            remaining += missing
+
+        for data in unchanged:
+            self.record_saved(key, data, None, "unchanged")
+
+        return remaining
+
+    def render_unchanged(self, key: str, records: list) -> list:
+        """Echo skipped records as the serializer would, reading their rows
+        through the model's read plan with one query per chunk. Return the
+        records whose row no longer exists."""
+        entry = get_registry_entry(key)
+        plan = entry.get_read_plan()
+        missing = []
+
+        for chunk in chunked(records, self.batch_size):
+            ids = [get_payload_id(data[key]) for data in chunk]
+            queryset = plan.values(entry.model.objects.filter(pk__in=ids))
+            rows = {obj["id"]: obj for obj in plan.render(queryset)}
+
+            for pk, data in zip(ids, chunk):
+                if pk in rows:
+                    data[key] = rows[pk]
+                else:
+                    missing.append(data)
+
+        return missing
+
+    def write_model(self, key: str, records: list) -> list:
+        """Validate and write a chunk of a bucket, return the saved records."""
+        model = get_serializer_model(key).Meta.model
+        valid = self.validate(key, records)
+        instances = self.get_instances(model, valid)
+        saved = []
+
+        # Commit the chunk in one transaction, each row in its own savepoint
+        with transaction.atomic():
+            for data, serializer in valid:
+                if self.save_row(key, data, serializer, instances):
+                    saved.append(data)
+
+        return saved
+
+    def save_row(self, key: str, data: dict, serializer, instances: dict) -> bool:
+        pk = serializer.validated_data["id"]
+        instance = instances.get(pk)
+
+        if instance is not None and not get_changed_fields(
+            instance, serializer.validated_data
+        ):
+            serializer.instance = instance
+            self.record_saved(key, data, serializer, "unchanged")
+            return True
+
+        try:
+            with transaction.atomic():
+                instances[pk] = serializer.save()
+        except IntegrityError as e:
+            self.record_invalid(key, data, str(e))
+            return False
+
+        outcome = "created" if instance is None else "updated"
+        self.record_saved(key, data, serializer, outcome)
+        return True
+
+
+class BulkImporter(ModelImporter):
+    """Import every bucket with set-based reads and writes."""
+
+    def write_model(self, key: str, records: list) -> list:
+        model = get_serializer_model(key).Meta.model
+        m2m_names = [field.name for field in model._meta.many_to_many]
+        valid = self.validate(key, records)
+        instances = self.get_instances(model, valid)
+
+        created, updated, changed_fields = {}, {}, set()
+        m2m_values = defaultdict(dict)
+        outcomes = []
+
+        for _, serializer in valid:
+            validated_data = dict(serializer.validated_data)
+            pk = validated_data["id"]
+            instance = instances.get(pk)
+            changed = (
+                list(validated_data)
+                if instance is None
+                else get_changed_fields(instance, validated_data)
+            )
+
+            for name in m2m_names:
+                if name in validated_data:
+                    value = validated_data.pop(name)
+                    if name in changed:
+                        m2m_values[name][pk] = value
+                        changed.remove(name)
+
+            if instance is None:
+                instance = instances[pk] = created[pk] = model(**validated_data)
+            else:
+                for name in changed:
+                    setattr(instance, name, validated_data[name])
+
+                if changed and pk not in created:
+                    updated[pk] = instance
+                    changed_fields.update(changed)
+
+            if pk in created:
+                outcomes.append("created")
+            elif changed or any(pk in values for values in m2m_values.values()):
+                outcomes.append("updated")
+            else:
+                outcomes.append("unchanged")
+
+            serializer.instance = instance
+
+        failed = {}
+        update_fields = [
+            field.name for field in model._meta.concrete_fields if not field.primary_key
+        ]
+
+        for chunk in chunked(created.values(), self.batch_size):
+            self.write(
+                chunk,
+                lambda objs: model.objects.bulk_create(
+                    objs,
+                    update_conflicts=True,
+                    unique_fields=["id"],
+                    update_fields=update_fields,
+                ),
+                lambda obj: obj.save(),
+                failed,
+            )
+
+        for chunk in chunked(updated.values(), self.batch_size):
+            self.write(
+                chunk,
+                lambda objs: model.objects.bulk_update(objs, list(changed_fields)),
+                lambda obj: obj.save(update_fields=list(changed_fields)),
+                failed,
+            )
+
+        for name, values in m2m_values.items():
+            self.write_m2m(model, name, values, failed)
+
+            # Drop the prefetched ids that were just replaced
+            for pk in values:
+                getattr(instances[pk], "_prefetched_objects_cache", {}).pop(name, None)
+
+        saved = []
+        for (data, serializer), outcome in zip(valid, outcomes):
+            pk = serializer.instance.pk
+            if pk in failed:
+                self.record_invalid(key, data, failed[pk])
+                continue
+
+            saved.append((data, serializer, outcome))
+
+        if m2m_names and self.report != "summary":
+            prefetch_related_objects(
+                list({serializer.instance for _, serializer, _ in saved}), *m2m_names
+            )
+
+        for data, serializer, outcome in saved:
+            self.record_saved(key, data, serializer, outcome)
+
+        return [data for data, _, _ in saved]
+
+    def write(self, objs: list, bulk_write, save, failed: dict) -> None:
+        """Write a chunk in one statement, isolating bad rows on conflict."""
+        try:
+            with transaction.atomic():
+                bulk_write(objs)
+            return
+        except IntegrityError:
+            pass
+
+        for obj in objs:
+            try:
+                with transaction.atomic():
+                    save(obj)
+            except IntegrityError as e:
+                failed[obj.pk] = str(e)
+
+    def write_m2m(self, model, name: str, values: dict, failed: dict) -> None:
+        """Replace the related ids of every imported row with two statements."""
+        field = model._meta.get_field(name)
+        through = field.remote_field.through
+        source = through._meta.get_field(field.m2m_field_name()).attname
+        target = through._meta.get_field(field.m2m_reverse_field_name()).attname
+        values = {pk: related for pk, related in values.items() if pk not in failed}
+
+        with transaction.atomic():
+            through.objects.filter(**{f"{source}__in": list(values)}).delete()
+            through.objects.bulk_create(
+                [
+                    through(**{source: pk, target: obj.pk})
+                    for pk, related in values.items()
+                    for obj in related
+                ],
+                batch_size=self.batch_size,
+                ignore_conflicts=True,
+            )
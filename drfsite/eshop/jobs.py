@@ -0,0 +1,126 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .importers import BulkImporter, ModelImporter
+from .models import ImportJob
+
+
+_executor = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Create the import worker pool on first use."""
+    global _executor
+
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.IMPORT_JOB_WORKERS, thread_name_prefix="import-job"
+        )
+    return _executor
+
+
+def create_import_job(json_data: list, options: dict) -> ImportJob:
+    """Persist the payload and queue the job once the row is committed.
+    With IMPORT_JOB_WORKERS = 0 the job runs inline after the commit."""
+    job = ImportJob.objects.create(
+        payload=json_data,
+        options=options,
+        total=sum(len(data) for data in json_data if isinstance(data, dict)),
+    )
+
+    if settings.IMPORT_JOB_WORKERS:
+        transaction.on_commit(lambda: get_executor().submit(run_in_worker, job.pk))
+    else:
+        transaction.on_commit(lambda: run_import_job(job.pk))
+
+    return job
+
+
+def run_in_worker(job_id: int) -> None:
+    try:
+        run_import_job(job_id)
+    finally:
+        # Worker threads own their connections, release them between jobs
+        connections.close_all()
+
+
+def run_import_job(job_id: int) -> None:
+    # Claim the job so a resumed job never runs twice
+    now = timezone.now()
+    claimed = ImportJob.objects.filter(pk=job_id, status=ImportJob.PENDING).update(
+        status=ImportJob.RUNNING, started_on=now, updated_on=now
+    )
+    if not claimed:
+        return
+
+    job = ImportJob.objects.get(pk=job_id)
+
+    # Only the counts while running, the full report is stored at the end
+    def progress(importer: ModelImporter) -> None:
+        ImportJob.objects.filter(pk=job_id).update(
+            processed=importer.processed,
+            result={
+                "summary": dict(importer.summary),
+                "unknown_models": dict(importer.unknown_counts),
+            },
+            updated_on=timezone.now(),
+        )
+
+    importer_class = BulkImporter if job.options.get("mode") == "bulk" else ModelImporter
+    importer = importer_class(
+        batch_size=job.options.get("batch_size"),
+        report=job.options.get("report", "summary"),
+        progress=progress,
+        natural_keys=job.options.get("natural_keys", False),
+    )
+
+    try:
+        job.result = importer.run(job.payload)
+        job.status = ImportJob.FINISHED
+    except Exception as e:
+        job.result, job.error = importer.result(), repr(e)
+        job.status = ImportJob.FAILED
+
+    job.processed, job.payload, job.finished_on = (
+        importer.processed,
+        None,
+        timezone.now(),
+    )
+    job.save()
+
+
+def recover_stale_jobs(stale_after: timedelta, fail: bool = False) -> list[int]:
+    """Find the jobs left pending or running by a worker that stopped, i.e.
+    not updated for stale_after, and run them again inline. Imports are
+    upserts, so re-running a partly applied payload converges. With fail
+    set they are marked failed instead. Return the recovered job ids."""
+    cutoff = timezone.now() - stale_after
+    stale = ImportJob.objects.filter(
+        status__in=[ImportJob.PENDING, ImportJob.RUNNING], updated_on__lt=cutoff
+    ).values_list("pk", "updated_on")
+    recovered = []
+
+    for job_id, updated_on in stale:
+        # Unchanged updated_on: no worker touched the job in the meantime
+        job = ImportJob.objects.filter(pk=job_id, updated_on=updated_on)
+        if fail:
+            claimed = job.update(
+                status=ImportJob.FAILED,
+                error="The import worker stopped before finishing the job",
+                payload=None,
+                finished_on=timezone.now(),
+                updated_on=timezone.now(),
+            )
+        else:
+            claimed = job.update(status=ImportJob.PENDING, updated_on=timezone.now())
+            if claimed:
+                run_import_job(job_id)
+
+        if claimed:
+            recovered.append(job_id)
+
+    return recovered
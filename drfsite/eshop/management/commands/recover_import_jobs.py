@@ -0,0 +1,30 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from eshop.jobs import recover_stale_jobs
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-run the import jobs left pending or running by a stopped worker, "
+        "or mark them failed with --fail."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--stale-after",
+            type=int,
+            default=600,
+            help="Seconds without progress after which a job is left behind.",
+        )
+        parser.add_argument(
+            "--fail", action="store_true", help="Mark the jobs failed instead."
+        )
+
+    def handle(self, *args, **options):
+        job_ids = recover_stale_jobs(
+            timedelta(seconds=options["stale_after"]), fail=options["fail"]
+        )
+        action = "Failed" if options["fail"] else "Re-ran"
+        self.stdout.write(f"{action} {len(job_ids)} import jobs.")
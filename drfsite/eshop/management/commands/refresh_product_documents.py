@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from eshop.documents import refresh_product_documents
+from eshop.models import Product
+
+
+class Command(BaseCommand):
+    help = "Rebuild the denormalized product documents and their search text."
+
+    def handle(self, *args, **options):
+        product_ids = list(Product.objects.values_list("pk", flat=True))
+        refresh_product_documents(product_ids)
+        self.stdout.write(f"Refreshed {len(product_ids)} product documents.")
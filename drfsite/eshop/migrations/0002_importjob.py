@@ -0,0 +1,29 @@
+# Generated by Django 5.0.2 on 2026-10-18 19:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eshop', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('finished', 'Finished'), ('failed', 'Failed')], default='pending', max_length=16)),
+                ('options', models.JSONField(default=dict)),
+                ('payload', models.JSONField(null=True)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('processed', models.PositiveIntegerField(default=0)),
+                ('result', models.JSONField(null=True)),
+                ('error', models.TextField(null=True)),
+                ('created_on', models.DateTimeField(auto_now_add=True)),
+                ('started_on', models.DateTimeField(null=True)),
+                ('finished_on', models.DateTimeField(null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.0.2 on 2026-10-18 19:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eshop', '0002_importjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportFingerprint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_name', models.CharField(max_length=64)),
+                ('object_id', models.BigIntegerField()),
+                ('digest', models.CharField(max_length=64)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='importfingerprint',
+            constraint=models.UniqueConstraint(fields=('model_name', 'object_id'), name='unique_import_fingerprint'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.0.2 on 2026-10-18 19:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eshop', '0003_importfingerprint'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='attribute',
+            index=models.Index(fields=['attribute_name', 'attribute_value'], name='attribute_name_value_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_published', 'currency'], name='product_published_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['published_on'], name='product_published_on_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['price'], name='product_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productattributes',
+            index=models.Index(fields=['attribute', 'product'], name='product_attribute_link_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.0.2 on 2026-10-18 19:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eshop', '0004_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductDocument',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='document', serialize=False, to='eshop.product')),
+                ('document', models.JSONField()),
+                ('updated_on', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
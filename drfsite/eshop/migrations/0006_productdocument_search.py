@@ -0,0 +1,71 @@
+# Generated by Django 5.0.2 on 2026-10-18 19:36
+
+from django.db import migrations, models
+
+
+# PostgreSQL: a GIN full-text index plus a trigram index for partial words
+POSTGRESQL_INDEX = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX product_document_search_idx ON eshop_productdocument "
+    "USING GIN (to_tsvector('simple', search_text))",
+    "CREATE INDEX product_document_trigram_idx ON eshop_productdocument "
+    "USING GIN (search_text gin_trgm_ops)",
+]
+POSTGRESQL_DROP = [
+    "DROP INDEX IF EXISTS product_document_trigram_idx",
+    "DROP INDEX IF EXISTS product_document_search_idx",
+]
+
+# SQLite: an external-content FTS5 table kept in sync by triggers
+SQLITE_INDEX = [
+    "CREATE VIRTUAL TABLE eshop_productdocument_fts USING fts5("
+    "search_text, content='eshop_productdocument', content_rowid='product_id')",
+    "CREATE TRIGGER eshop_productdocument_fts_insert AFTER INSERT ON "
+    "eshop_productdocument BEGIN INSERT INTO eshop_productdocument_fts"
+    "(rowid, search_text) VALUES (new.product_id, new.search_text); END",
+    "CREATE TRIGGER eshop_productdocument_fts_delete AFTER DELETE ON "
+    "eshop_productdocument BEGIN INSERT INTO eshop_productdocument_fts"
+    "(eshop_productdocument_fts, rowid, search_text) "
+    "VALUES ('delete', old.product_id, old.search_text); END",
+    "CREATE TRIGGER eshop_productdocument_fts_update AFTER UPDATE ON "
+    "eshop_productdocument BEGIN INSERT INTO eshop_productdocument_fts"
+    "(eshop_productdocument_fts, rowid, search_text) "
+    "VALUES ('delete', old.product_id, old.search_text); "
+    "INSERT INTO eshop_productdocument_fts(rowid, search_text) "
+    "VALUES (new.product_id, new.search_text); END",
+    "INSERT INTO eshop_productdocument_fts(eshop_productdocument_fts) "
+    "VALUES ('rebuild')",
+]
+SQLITE_DROP = [
+    "DROP TRIGGER IF EXISTS eshop_productdocument_fts_update",
+    "DROP TRIGGER IF EXISTS eshop_productdocument_fts_delete",
+    "DROP TRIGGER IF EXISTS eshop_productdocument_fts_insert",
+    "DROP TABLE IF EXISTS eshop_productdocument_fts",
+]
+
+
+def run_for_vendor(statements):
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eshop', '0005_productdocument'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productdocument',
+            name='search_text',
+            field=models.TextField(default=''),
+        ),
+        migrations.RunPython(
+            run_for_vendor({"postgresql": POSTGRESQL_INDEX, "sqlite": SQLITE_INDEX}),
+            run_for_vendor({"postgresql": POSTGRESQL_DROP, "sqlite": SQLITE_DROP}),
+        ),
+    ]
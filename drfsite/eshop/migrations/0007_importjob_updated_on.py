@@ -0,0 +1,20 @@
+# Generated by Django 5.0.2 on 2026-10-18 21:40
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eshop', '0006_productdocument_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='updated_on',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
@@ -26,6 +26,14 @@ class Attribute(models.Model):
         AttributeValue, related_name="attribute", on_delete=models.CASCADE
     )
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["attribute_name", "attribute_value"],
+                name="attribute_name_value_idx",
+            ),
+        ]
+
     def __str__(self):
         return f"{self.attribute_name} - {self.attribute_value}"
 
@@ -46,6 +54,15 @@ class Product(models.Model):
     published_on = models.DateTimeField(null=True)
     is_published = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["is_published", "currency"], name="product_published_idx"
+            ),
+            models.Index(fields=["published_on"], name="product_published_on_idx"),
+            models.Index(fields=["price"], name="product_price_idx"),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -60,6 +77,13 @@ class ProductAttributes(models.Model):
         Product, related_name="product_attribute", on_delete=models.CASCADE
     )
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["attribute", "product"], name="product_attribute_link_idx"
+            ),
+        ]
+
     def __str__(self):
         return f"Product Attribute of {self.product}"
 
@@ -103,3 +127,60 @@ class Catalog(models.Model):
 
     def __str__(self):
         return self.name
+
+
+class ImportJob(models.Model):
+    PENDING = "pending"
+    RUNNING = "running"
+    FINISHED = "finished"
+    FAILED = "failed"
+    STATUSES = [
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (FINISHED, "Finished"),
+        (FAILED, "Failed"),
+    ]
+
+    status = models.CharField(max_length=16, choices=STATUSES, default=PENDING)
+    options = models.JSONField(default=dict)
+    payload = models.JSONField(null=True)
+    total = models.PositiveIntegerField(default=0)
+    processed = models.PositiveIntegerField(default=0)
+    result = models.JSONField(null=True)
+    error = models.TextField(null=True)
+    created_on = models.DateTimeField(auto_now_add=True)
+    started_on = models.DateTimeField(null=True)
+    finished_on = models.DateTimeField(null=True)
+    # Refreshed with every progress report, jobs left behind stop updating it
+    updated_on = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Import job {self.pk} ({self.status})"
+
+
+class ImportFingerprint(models.Model):
+    model_name = models.CharField(max_length=64)
+    object_id = models.BigIntegerField()
+    digest = models.CharField(max_length=64)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["model_name", "object_id"], name="unique_import_fingerprint"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.model_name} {self.object_id}"
+
+
+class ProductDocument(models.Model):
+    product = models.OneToOneField(
+        Product, primary_key=True, related_name="document", on_delete=models.CASCADE
+    )
+    document = models.JSONField()
+    search_text = models.TextField(default="")
+    updated_on = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Document of {self.product_id}"
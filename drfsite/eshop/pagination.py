@@ -0,0 +1,134 @@
+import copy
+import json
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination
+
+
+MAX_PAGE_SIZE = 1000
+
+
+class KeysetQuerySet:
+    """Queryset stand-in for DRF's cursor paginator, which filters on the
+    position of the first ordering column only. With an id tie-breaker the
+    position of a row is its (value, id) pair and the filter compares both,
+    so rows sharing a value are neither repeated nor skipped."""
+
+    def __init__(self, queryset, ordering: tuple[str, ...]):
+        self.queryset = queryset
+        self.ordering = ordering
+
+    def clone(self, queryset):
+        clone = copy.copy(self)
+        clone.queryset = queryset
+        return clone
+
+    def order_by(self, *fields):
+        return self.clone(self.queryset.order_by(*fields))
+
+    def filter(self, **lookups):
+        if len(self.ordering) == 1:
+            return self.clone(self.queryset.filter(**lookups))
+
+        # The tie-breaker sorts in the same direction, so it shares the operator
+        ((lookup, position),) = lookups.items()
+        column, operator = lookup.rsplit("__", 1)
+        try:
+            value, pk = json.loads(position)
+            return self.clone(
+                self.queryset.filter(
+                    Q(**{lookup: value}) | Q(**{column: value, f"id__{operator}": pk})
+                )
+            )
+        except (TypeError, ValueError, DjangoValidationError):
+            raise NotFound(CursorPagination.invalid_cursor_message)
+
+    def __getitem__(self, key):
+        return self.queryset[key]
+
+
+class IdCursorPagination(CursorPagination):
+    """Keyset pagination on the primary key, so every page is an index range
+    scan whatever its position in the table. Other orderings are paged on the
+    (column, id) pair."""
+
+    ordering = "id"
+    page_size_query_param = "page_size"
+    max_page_size = MAX_PAGE_SIZE
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not isinstance(queryset, KeysetQuerySet):
+            ordering = self.get_ordering(request, queryset, view)
+            queryset = KeysetQuerySet(queryset, ordering)
+        return super().paginate_queryset(queryset, request, view)
+
+    def _get_position_from_instance(self, instance, ordering):
+        if len(ordering) == 1:
+            return super()._get_position_from_instance(instance, ordering)
+
+        value = getattr(instance, ordering[0].lstrip("-"))
+        return json.dumps([str(value), instance.id], separators=(",", ":"))
+
+
+class ModelLimitOffsetPagination(LimitOffsetPagination):
+    max_limit = MAX_PAGE_SIZE
+
+
+def get_paginator(
+    request, order_by: tuple[str, ...] = ("id",)
+) -> CursorPagination | LimitOffsetPagination:
+    """Fall back to limit/offset pagination when the client asks for it.
+    The cursor is keyed on the requested ordering."""
+    if "limit" in request.query_params or "offset" in request.query_params:
+        return ModelLimitOffsetPagination()
+
+    paginator = IdCursorPagination()
+    paginator.ordering = order_by
+    return paginator
+
+
+class PageQuery(Exception):
+    """Carries the page query out of DRF's paginator so it can be awaited."""
+
+    def __init__(self, queryset):
+        self.queryset = queryset
+
+
+class PrefetchedPage(KeysetQuerySet):
+    """KeysetQuerySet whose slice either hands the page query out through
+    PageQuery or returns the rows already fetched for it."""
+
+    def __init__(self, queryset, ordering: tuple[str, ...], rows: list | None = None):
+        super().__init__(queryset, ordering)
+        self.rows = rows
+
+    def __getitem__(self, key):
+        if self.rows is None:
+            raise PageQuery(self.queryset[key])
+        return self.rows
+
+
+class AsyncIdCursorPagination(IdCursorPagination):
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """Run DRF's cursor pagination with the page read through aiterator(),
+        so cursors are interchangeable with the synchronous endpoints."""
+        ordering = self.get_ordering(request, queryset, view)
+        try:
+            return self.paginate_queryset(
+                PrefetchedPage(queryset, ordering), request, view
+            )
+        except PageQuery as query:
+            rows = [row async for row in query.queryset.aiterator()]
+
+        return self.paginate_queryset(
+            PrefetchedPage(queryset, ordering, rows), request, view
+        )
+
+
+def get_async_paginator(order_by: tuple[str, ...] = ("id",)) -> AsyncIdCursorPagination:
+    """Async endpoints page with cursors only, limit/offset needs a count."""
+    paginator = AsyncIdCursorPagination()
+    paginator.ordering = order_by
+    return paginator
@@ -0,0 +1,125 @@
+import codecs
+import json
+import re
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, JSONParser
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+READ_SIZE = 64 * 1024
+# Longest token a block boundary can cut short
+TRUNCATION_MARGIN = len("-Infinity")
+
+
+def is_truncated(exc: json.JSONDecodeError, size: int) -> bool:
+    """Tell a value cut off by the end of the buffer from invalid JSON."""
+    if exc.msg.startswith("Unterminated string"):
+        return True
+    return exc.pos >= size - TRUNCATION_MARGIN
+
+
+def iter_json_array(
+    stream,
+    encoding: str = "utf-8",
+    read_size: int = READ_SIZE,
+    max_item_size: int | None = None,
+):
+    """Yield the items of a top-level JSON array while reading the stream in
+    fixed-size blocks, so only the current block and item are held in memory.
+    An item longer than max_item_size characters is rejected."""
+    if max_item_size is None:
+        max_item_size = settings.IMPORT_STREAM_MAX_ITEM_SIZE
+    text_decoder = codecs.getincrementaldecoder(encoding)()
+    decoder = json.JSONDecoder()
+    buffer, position, eof = "", 0, False
+    state = "start"
+
+    def read(rest: str) -> str:
+        nonlocal eof
+        block = stream.read(read_size)
+        eof = not block
+        return rest + text_decoder.decode(block, final=eof)
+
+    while True:
+        position = WHITESPACE.match(buffer, position).end()
+
+        if position == len(buffer):
+            if not eof:
+                buffer, position = read(""), 0
+                continue
+            if state == "end":
+                return
+            raise ParseError("JSON parse error - unexpected end of data")
+
+        if state == "end":
+            raise ParseError("JSON parse error - extra data after the array")
+
+        char = buffer[position]
+
+        if state == "start":
+            if char != "[":
+                raise ParseError("JSON parse error - expected a JSON array")
+            position, state = position + 1, "first"
+        elif state in ("first", "next") and char == "]":
+            position, state = position + 1, "end"
+        elif state == "next":
+            if char != ",":
+                raise ParseError("JSON parse error - expected ',' or ']'")
+            position, state = position + 1, "item"
+        else:
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError as exc:
+                if eof or not is_truncated(exc, len(buffer)):
+                    raise ParseError(f"JSON parse error - {exc}")
+                end = None
+
+            # A value cut off by the end of the block continues in the next one
+            if end is None or (end == len(buffer) and not eof):
+                if len(buffer) - position > max_item_size:
+                    raise ParseError(
+                        "JSON parse error - item longer than"
+                        f" {max_item_size} characters"
+                    )
+                buffer, position = read(buffer[position:]), 0
+                continue
+
+            position, state = end, "next"
+            yield item
+
+
+class StreamingJSONParser(BaseParser):
+    """Parse a JSON array lazily instead of loading the whole body."""
+
+    media_type = "application/json"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get("encoding", settings.DEFAULT_CHARSET)
+        return iter_json_array(stream, encoding)
+
+
+class ORJSONParser(JSONParser):
+    """Parse a JSON body with orjson when it is installed."""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None:
+            return super().parse(stream, media_type, parser_context)
+
+        parser_context = parser_context or {}
+        encoding = parser_context.get("encoding", settings.DEFAULT_CHARSET)
+
+        try:
+            data = stream.read()
+            if codecs.lookup(encoding).name != "utf-8":
+                data = data.decode(encoding)
+            return orjson.loads(data)
+        except ValueError as exc:
+            raise ParseError(f"JSON parse error - {exc}")
@@ -0,0 +1,207 @@
+import copy
+from collections import defaultdict
+from functools import lru_cache
+from itertools import islice
+from typing import Callable, NamedTuple
+
+from asgiref.sync import sync_to_async
+from django.db import connections
+from django.db.models import Aggregate, CharField, Model, OuterRef, Subquery
+from django.db.models.query import QuerySet
+from rest_framework.fields import DateTimeField
+from rest_framework.relations import ManyRelatedField, PrimaryKeyRelatedField
+from rest_framework.serializers import ModelSerializer
+
+
+class GroupConcat(Aggregate):
+    """SQLite's group_concat(), standing in for ArrayAgg."""
+
+    function = "GROUP_CONCAT"
+    output_field = CharField()
+
+
+def get_ids_aggregate(vendor: str, column: str) -> Aggregate | None:
+    """Aggregate the related ids of a row into one value, or return None when
+    the backend has no aggregate that keeps every id."""
+    if vendor == "postgresql":
+        # Imported here, the module needs psycopg
+        from django.contrib.postgres.aggregates import ArrayAgg
+
+        return ArrayAgg(column, ordering=column)
+    if vendor == "sqlite":
+        return GroupConcat(column)
+    return None
+
+
+def parse_ids(value) -> list:
+    """Read an aggregated id list: an array, a comma-separated string or NULL."""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return sorted(int(pk) for pk in value.split(","))
+    return value
+
+
+class ManyRelation(NamedTuple):
+    through: type[Model]
+    source: str
+    target: str
+
+
+class ReadPlan(NamedTuple):
+    """Field accessors of a serializer compiled once per model and projection.
+
+    Rows are fetched as named values_list() tuples of exactly the serialized
+    columns. Each output field is (name, column, convert): the column value
+    is passed through the DRF field's own to_representation, so decimals and
+    datetimes come out exactly as the serializer writes them. Many-to-many
+    fields have no column; their ids are aggregated into the same query where
+    the backend allows it, and read per batch otherwise."""
+
+    columns: tuple[str, ...]
+    fields: tuple[tuple[str, str | None, Callable | None], ...]
+    relations: dict[str, ManyRelation]
+    datetime_fields: tuple[tuple[int, DateTimeField], ...]
+
+    def bind_fields(self) -> list:
+        """Give the datetime fields the current time zone, which DRF would
+        otherwise look up again for every value."""
+        fields = list(self.fields)
+
+        for index, field in self.datetime_fields:
+            bound = copy.copy(field)
+            if not hasattr(bound, "timezone"):
+                bound.timezone = field.default_timezone()
+            fields[index] = (*fields[index][:2], bound.to_representation)
+
+        return fields
+
+    def get_aggregates(self, vendor: str) -> dict | None:
+        """Build one correlated id aggregate per many-to-many relation."""
+        aggregates = {}
+
+        for name, (through, source, target) in self.relations.items():
+            ids = get_ids_aggregate(vendor, target)
+            if ids is None:
+                return None
+
+            aggregates[f"m2m_{name}"] = Subquery(
+                through.objects.filter(**{source: OuterRef("pk")})
+                .values(source)
+                .annotate(ids=ids)
+                .values("ids")
+            )
+
+        return aggregates
+
+    def values(self, queryset: QuerySet, *extra: str) -> QuerySet:
+        """Turn a queryset into named tuples of the plan's columns, plus any
+        extra column the caller reads, such as the sort column."""
+        extra = [column for column in extra if column not in self.columns]
+        queryset = queryset.prefetch_related(None)
+        aggregates = self.get_aggregates(connections[queryset.db].vendor) or {}
+
+        if aggregates:
+            queryset = queryset.annotate(**aggregates)
+        return queryset.values_list(*self.columns, *extra, *aggregates, named=True)
+
+    def get_related_ids(self, pks: list) -> dict[str, dict]:
+        """Read the ids of every many-to-many relation with one query each."""
+        related = {}
+
+        for name, (through, source, target) in self.relations.items():
+            ids = defaultdict(list)
+            for pk, related_pk in (
+                through.objects.filter(**{f"{source}__in": pks})
+                .order_by(source, target)
+                .values_list(source, target)
+            ):
+                ids[pk].append(related_pk)
+            related[name] = ids
+
+        return related
+
+    def is_aggregated(self, rows: list) -> bool:
+        # Rows of backends without an id aggregate have no m2m_ columns
+        return not rows or all(
+            f"m2m_{name}" in rows[0]._fields for name in self.relations
+        )
+
+    async def arender(self, rows) -> list[dict]:
+        """render() for async views, reading the ids the backend could not
+        aggregate in a worker thread."""
+        rows = list(rows)
+        if self.is_aggregated(rows):
+            return self.render(rows)
+        return await sync_to_async(self.render)(rows)
+
+    def render(self, rows) -> list[dict]:
+        """Serialize a batch of rows fetched through values()."""
+        rows = list(rows)
+        aggregated = self.is_aggregated(rows)
+        related = {} if aggregated else self.get_related_ids([row.id for row in rows])
+        fields = self.bind_fields()
+        data = []
+
+        for row in rows:
+            obj = {}
+            for name, column, convert in fields:
+                if column is None and aggregated:
+                    obj[name] = parse_ids(getattr(row, f"m2m_{name}"))
+                    continue
+                if column is None:
+                    obj[name] = related[name].get(row.id, [])
+                    continue
+
+                value = getattr(row, column)
+                if value is not None and convert is not None:
+                    value = convert(value)
+                obj[name] = value
+            data.append(obj)
+
+        return data
+
+    def iter_render(self, rows, chunk_size: int):
+        """Serialize a row iterator chunk by chunk."""
+        rows = iter(rows)
+        while chunk := list(islice(rows, chunk_size)):
+            yield from self.render(chunk)
+
+
+@lru_cache(maxsize=256)
+def get_read_plan(
+    serializer_class: type[ModelSerializer], fields: tuple[str, ...] | None = None
+) -> ReadPlan:
+    """Compile the output fields of a model serializer into a ReadPlan."""
+    model = serializer_class.Meta.model
+    serializer = serializer_class(fields=fields)
+    columns, plan_fields, relations, datetime_fields = ["id"], [], {}, []
+
+    for name, field in serializer.fields.items():
+        model_field = model._meta.get_field(field.source)
+
+        if isinstance(field, ManyRelatedField):
+            through = model_field.remote_field.through
+            relations[name] = ManyRelation(
+                through,
+                through._meta.get_field(model_field.m2m_field_name()).attname,
+                through._meta.get_field(model_field.m2m_reverse_field_name()).attname,
+            )
+            plan_fields.append((name, None, None))
+            continue
+
+        if field.source not in columns:
+            columns.append(field.source)
+
+        if isinstance(field, DateTimeField):
+            datetime_fields.append((len(plan_fields), field))
+
+        # Related fields output the primary key the column already holds
+        if isinstance(field, PrimaryKeyRelatedField):
+            plan_fields.append((name, field.source, None))
+        else:
+            plan_fields.append((name, field.source, field.to_representation))
+
+    return ReadPlan(
+        tuple(columns), tuple(plan_fields), relations, tuple(datetime_fields)
+    )
@@ -0,0 +1,38 @@
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class ORJSONRenderer(JSONRenderer):
+    """Render JSON with orjson when it is installed, byte for byte as DRF's
+    JSONRenderer does for compact UTF-8 output: UTC datetimes end in "Z" and
+    every type orjson does not know (Decimal, lazy strings...) goes through
+    DRF's JSONEncoder. Indented or ASCII-only output is left to DRF."""
+
+    options = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS if orjson else 0
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        native = indent is None and self.compact and not self.ensure_ascii
+
+        if orjson is None or not native:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        if data is None:
+            return b""
+
+        try:
+            ret = orjson.dumps(
+                data, default=self.encoder_class().default, option=self.options
+            )
+        except orjson.JSONEncodeError:
+            # Integers beyond 64 bits and the like
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Like DRF, escape the separators JavaScript treats as line breaks
+        return ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(
+            b"\xe2\x80\xa9", b"\\u2029"
+        )
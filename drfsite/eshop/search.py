@@ -0,0 +1,77 @@
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.query import QuerySet
+
+from .models import ProductDocument
+
+
+WORD = re.compile(r"\w+")
+
+
+def get_fts_query(query: str) -> str:
+    """Turn free text into an FTS5 query matching every word as a prefix,
+    so user input never reaches the FTS5 query syntax."""
+    return " ".join(f'"{word}"*' for word in WORD.findall(query))
+
+
+def search_postgresql(documents: QuerySet, query: str) -> QuerySet:
+    # Expressions match the GIN indexes created by the migration
+    return documents.filter(
+        RawSQL(
+            "to_tsvector('simple', search_text) @@ plainto_tsquery('simple', %s)"
+            " OR %s <%% search_text",
+            [query, query],
+            output_field=BooleanField(),
+        )
+    ).annotate(
+        rank=RawSQL(
+            "ts_rank(to_tsvector('simple', search_text),"
+            " plainto_tsquery('simple', %s)) + word_similarity(%s, search_text)",
+            [query, query],
+            output_field=FloatField(),
+        )
+    )
+
+
+def search_sqlite(documents: QuerySet, query: str) -> QuerySet:
+    fts_query = get_fts_query(query)
+
+    if not fts_query:
+        return documents.none()
+
+    # bm25() is lower for better matches
+    return documents.filter(
+        RawSQL(
+            "product_id IN (SELECT rowid FROM eshop_productdocument_fts"
+            " WHERE eshop_productdocument_fts MATCH %s)",
+            [fts_query],
+            output_field=BooleanField(),
+        )
+    ).annotate(
+        rank=RawSQL(
+            "(SELECT -bm25(eshop_productdocument_fts) FROM eshop_productdocument_fts"
+            " WHERE eshop_productdocument_fts MATCH %s"
+            " AND rowid = eshop_productdocument.product_id)",
+            [fts_query],
+            output_field=FloatField(),
+        )
+    )
+
+
+def search_products(query: str) -> QuerySet:
+    """Return the product documents matching the query, best match first."""
+    documents = ProductDocument.objects.only("product_id", "document")
+
+    if connection.vendor == "postgresql":
+        documents = search_postgresql(documents, query)
+    elif connection.vendor == "sqlite":
+        documents = search_sqlite(documents, query)
+    else:
+        documents = documents.filter(search_text__icontains=query).annotate(
+            rank=Value(0.0, output_field=FloatField())
+        )
+
+    return documents.order_by("-rank", "product_id")
@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from django.core.exceptions import ValidationError as DjangoValidationError
 from django.forms.models import model_to_dict
 
 
@@ -12,10 +13,49 @@ from .models import (
     Image,
     ProductImage,
     Catalog,
+    ImportJob,
 )
 
 
-class AttributeNameSerializer(serializers.ModelSerializer):
+class CachedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Resolve primary keys from the "related_objects" context map, which the
+    importer fills with one in_bulk per target model, instead of a SELECT per
+    value. Falls back to the regular queryset lookup without that map."""
+
+    def to_internal_value(self, data):
+        related_objects = self.context.get("related_objects", {})
+        model = self.queryset.model
+
+        if model not in related_objects:
+            return super().to_internal_value(data)
+
+        try:
+            if isinstance(data, bool):
+                raise TypeError
+            pk = model._meta.pk.to_python(data)
+        except (TypeError, ValueError, DjangoValidationError):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+
+        try:
+            return related_objects[model][pk]
+        except KeyError:
+            self.fail("does_not_exist", pk_value=data)
+
+
+class DynamicFieldsModelSerializer(serializers.ModelSerializer):
+    """Accept an optional "fields" argument that restricts the output to the
+    given field names."""
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop("fields", None)
+        super().__init__(*args, **kwargs)
+
+        if fields is not None:
+            for field_name in set(self.fields) - set(fields):
+                self.fields.pop(field_name)
+
+
+class AttributeNameSerializer(DynamicFieldsModelSerializer):
     id = serializers.IntegerField()
     nazev = serializers.CharField(source="name")
     zobrazit = serializers.BooleanField(source="display", required=False)
@@ -41,7 +81,7 @@ class AttributeNameSerializer(serializers.ModelSerializer):
             return AttributeName.objects.create(**validated_data)
 
 
-class AttributeValueSerializer(serializers.ModelSerializer):
+class AttributeValueSerializer(DynamicFieldsModelSerializer):
     id = serializers.IntegerField()
     hodnota = serializers.CharField(source="value")
 
@@ -63,12 +103,12 @@ class AttributeValueSerializer(serializers.ModelSerializer):
             return AttributeValue.objects.create(**validated_data)
 
 
-class AttributeSerializer(serializers.ModelSerializer):
+class AttributeSerializer(DynamicFieldsModelSerializer):
     id = serializers.IntegerField()
-    nazev_atributu_id = serializers.PrimaryKeyRelatedField(
+    nazev_atributu_id = CachedPrimaryKeyRelatedField(
         queryset=AttributeName.objects.all(), source="attribute_name"
     )
-    hodnota_atributu_id = serializers.PrimaryKeyRelatedField(
+    hodnota_atributu_id = CachedPrimaryKeyRelatedField(
         queryset=AttributeValue.objects.all(), source="attribute_value"
     )
 
@@ -96,7 +136,7 @@ class AttributeSerializer(serializers.ModelSerializer):
             return Attribute.objects.create(**validated_data)
 
 
-class ProductSeralizer(serializers.ModelSerializer):
+class ProductSeralizer(DynamicFieldsModelSerializer):
     id = serializers.IntegerField()
     nazev = serializers.CharField(source="name", required=False)
     cena = serializers.DecimalField(
@@ -143,10 +183,10 @@ class ProductSeralizer(serializers.ModelSerializer):
             return Product.objects.create(**validated_data)
 
 
-class ProductAttributesSeralizer(serializers.ModelSerializer):
+class ProductAttributesSeralizer(DynamicFieldsModelSerializer):
     id = serializers.IntegerField()
-    attribute = serializers.PrimaryKeyRelatedField(queryset=Attribute.objects.all())
-    product = serializers.PrimaryKeyRelatedField(queryset=Product.objects.all())
+    attribute = CachedPrimaryKeyRelatedField(queryset=Attribute.objects.all())
+    product = CachedPrimaryKeyRelatedField(queryset=Product.objects.all())
 
     class Meta:
         model = ProductAttributes
@@ -169,7 +209,7 @@ class ProductAttributesSeralizer(serializers.ModelSerializer):
             return ProductAttributes.objects.create(**validated_data)
 
 
-class ImageSerializer(serializers.ModelSerializer):
+class ImageSerializer(DynamicFieldsModelSerializer):
     id = serializers.IntegerField()
     nazev = serializers.CharField(source="name", required=False)
     obrazek = serializers.URLField(source="image")
@@ -193,13 +233,13 @@ class ImageSerializer(serializers.ModelSerializer):
             return Image.objects.create(**validated_data)
 
 
-class ProductImageSerializer(serializers.ModelSerializer):
+class ProductImageSerializer(DynamicFieldsModelSerializer):
     id = serializers.IntegerField()
     nazev = serializers.CharField(source="name", required=False)
-    product = serializers.PrimaryKeyRelatedField(
+    product = CachedPrimaryKeyRelatedField(
         queryset=Product.objects.all(),
     )
-    obrazek_id = serializers.PrimaryKeyRelatedField(
+    obrazek_id = CachedPrimaryKeyRelatedField(
         queryset=Image.objects.all(),
         source="image",
     )
@@ -223,17 +263,17 @@ class ProductImageSerializer(serializers.ModelSerializer):
             return ProductImage.objects.create(**validated_data)
 
 
-class CatalogSerializer(serializers.ModelSerializer):
+class CatalogSerializer(DynamicFieldsModelSerializer):
     id = serializers.IntegerField()
     nazev = serializers.CharField(source="name", required=False)
-    obrazek_id = serializers.PrimaryKeyRelatedField(
+    obrazek_id = CachedPrimaryKeyRelatedField(
         queryset=Image.objects.all(), source="image", required=False
     )
-    products_ids = serializers.PrimaryKeyRelatedField(
+    products_ids = CachedPrimaryKeyRelatedField(
         queryset=Product.objects.all(), source="products", many=True, required=False
     )
 
-    attributes_ids = serializers.PrimaryKeyRelatedField(
+    attributes_ids = CachedPrimaryKeyRelatedField(
         queryset=Attribute.objects.all(), source="attributes", many=True, required=False
     )
 
@@ -260,3 +300,20 @@ class CatalogSerializer(serializers.ModelSerializer):
         )
         instance.save()
         return instance
+
+
+class ImportJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ImportJob
+        fields = [
+            "id",
+            "status",
+            "options",
+            "total",
+            "processed",
+            "result",
+            "error",
+            "created_on",
+            "started_on",
+            "finished_on",
+        ]
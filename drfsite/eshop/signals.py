@@ -0,0 +1,102 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed
+from django.dispatch import receiver
+
+from .cache import invalidate_m2m_dependents, invalidate_model, invalidate_rows
+from .documents import (
+    get_affected_products,
+    refresh_deferred,
+    schedule_document_refresh,
+)
+from .importers import forget_fingerprints
+from .models import Catalog, Product
+from .utils import models
+
+
+def get_document_products(sender, instance):
+    """Return the products whose documents show this row, reading the id off
+    the row itself where it has one."""
+    if sender is Product:
+        return [instance.pk]
+    if hasattr(instance, "product_id"):
+        return [instance.product_id]
+    return get_affected_products(sender.__name__, [instance.pk])
+
+
+def invalidate_on_commit(invalidate, *args) -> None:
+    """Drop cached reads once the write commits: dropped earlier, a concurrent
+    read would cache the old row again under the new version."""
+    transaction.on_commit(lambda: invalidate(*args))
+
+
+def refresh_row_documents(sender, instance) -> None:
+    # Importers rebuild the documents per batch, skip the product lookup
+    if not refresh_deferred.get():
+        schedule_document_refresh(get_document_products(sender, instance))
+
+
+def forget_m2m_dependents(sender, instance) -> None:
+    """Deleting a row removes its many-to-many links without m2m_changed, so
+    the rows that linked to it must be compared again on the next import."""
+    for key, model in models.items():
+        for field in model._meta.many_to_many:
+            if field.related_model is not sender:
+                continue
+
+            through = field.remote_field.through
+            source = through._meta.get_field(field.m2m_field_name()).attname
+            target = through._meta.get_field(field.m2m_reverse_field_name()).attname
+            forget_fingerprints(
+                key, through.objects.filter(**{target: instance.pk}).values(source)
+            )
+
+
+def row_saved(sender, instance, **kwargs):
+    # Importers store the fingerprints of the rows they write after each chunk
+    if not refresh_deferred.get():
+        forget_fingerprints(sender.__name__, [instance.pk])
+    invalidate_on_commit(invalidate_rows, sender.__name__, [instance.pk])
+    refresh_row_documents(sender, instance)
+
+
+def row_deleting(sender, instance, **kwargs):
+    # Read the links and products before the cascade removes them
+    forget_m2m_dependents(sender, instance)
+    refresh_row_documents(sender, instance)
+
+
+def row_deleted(sender, instance, **kwargs):
+    forget_fingerprints(sender.__name__, [instance.pk])
+    invalidate_on_commit(invalidate_rows, sender.__name__, [instance.pk])
+    invalidate_on_commit(invalidate_m2m_dependents, sender.__name__)
+
+
+@receiver(m2m_changed, sender=Catalog.products.through)
+@receiver(m2m_changed, sender=Catalog.attributes.through)
+def catalog_links_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith("post_"):
+        return
+
+    if not reverse:
+        forget_fingerprints("Catalog", [instance.pk])
+        invalidate_on_commit(invalidate_rows, "Catalog", [instance.pk])
+    elif pk_set is not None:
+        forget_fingerprints("Catalog", pk_set)
+        invalidate_on_commit(invalidate_rows, "Catalog", set(pk_set))
+    else:
+        forget_fingerprints("Catalog")
+        invalidate_on_commit(invalidate_model, "Catalog")
+
+
+@receiver(m2m_changed, sender=Catalog.products.through)
+def catalog_products_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Catalog membership is part of the product documents."""
+    if action not in ("post_add", "post_remove", "pre_clear") or refresh_deferred.get():
+        return
+
+    if reverse:
+        schedule_document_refresh([instance.pk])
+    elif pk_set is not None:
+        schedule_document_refresh(pk_set)
+    else:
+        schedule_document_refresh(get_affected_products("Catalog", [instance.pk]))
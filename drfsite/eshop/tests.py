@@ -1,7 +1,19 @@
+import asyncio
+import io
 import json
+from collections import OrderedDict
+from datetime import datetime, timezone
+from decimal import Decimal
+from unittest import mock
 
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.exceptions import ParseError
 from django.forms.models import model_to_dict
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APIClient
 from rest_framework import status
 
@@ -14,12 +26,21 @@ from .models import (
     Image,
     ProductAttributes,
     Catalog,
+    ImportFingerprint,
+    ImportJob,
+    ProductDocument,
 )
+from .parsers import ORJSONParser, iter_json_array
+from .renderers import ORJSONRenderer
+from .serializers import ProductAttributesSeralizer
+from .importers import BulkImporter, ModelImporter
+from .utils import get_deserialized_object, get_registry_entry
 
 
 class APIViewTest(TestCase):
 
     def setUp(self):
+        cache.clear()
         self.attribute_name = AttributeName.objects.create(
             id=1, name="Color", display=True, code="05"
         )
@@ -282,11 +303,84 @@ class APIViewTest(TestCase):
     def test_model_list_get(self):
         url = "/detail/image/"
         response = self.client.get(url)
-        data = response.json()
+        data = response.json()["results"]
         image = data[0]
 
         self.assertEqual(len(data), 1)
 
+    def test_model_list_cursor_pagination(self):
+        for pk in range(2, 5):
+            Product.objects.create(id=pk, name=f"Phone {pk}", description="", price=1)
+
+        ids, url = [], "/detail/product/?page_size=3"
+        while url:
+            page = self.client.get(url).json()
+            ids += [product["id"] for product in page["results"]]
+            url = page["next"]
+
+        self.assertEqual(ids, [1, 2, 3, 4])
+
+    def test_model_list_cursor_on_repeated_values(self):
+        Product.objects.bulk_create(
+            Product(id=pk, name=f"Phone {pk}", description="", price=1, currency="CZK")
+            for pk in range(2, 1202)
+        )
+
+        for ordering in ("currency", "-is_published", "price"):
+            pages, url = [], f"/detail/product/?ordering={ordering}&page_size=500"
+            while url:
+                page = self.client.get(url).json()
+                pages.append(page)
+                url = page["next"]
+
+            ids = [product["id"] for page in pages for product in page["results"]]
+            self.assertEqual(len(pages), 3)
+            self.assertEqual(sorted(ids), list(range(1, 1202)))
+
+            # Walking back from the last page gives the same pages
+            previous = self.client.get(pages[-1]["previous"]).json()
+            self.assertEqual(previous["results"], pages[-2]["results"])
+
+        response = self.client.get("/detail/product/?ordering=price&cursor=cD1bMV0=")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_model_list_limit_offset_pagination(self):
+        for pk in range(2, 5):
+            Product.objects.create(id=pk, name=f"Phone {pk}", description="", price=1)
+
+        page = self.client.get("/detail/product/?limit=2&offset=1").json()
+
+        self.assertEqual(page["count"], 4)
+        self.assertEqual([product["id"] for product in page["results"]], [2, 3])
+        self.assertIsNotNone(page["next"])
+
+    def test_model_list_stream(self):
+        Product.objects.create(id=2, name="Tablet", description="Big", price=10)
+        paginated = self.client.get("/detail/product/").json()["results"]
+
+        response = self.client.get("/detail/product/?stream=json")
+        self.assertEqual(json.loads(b"".join(response.streaming_content)), paginated)
+
+        response = self.client.get("/detail/product/?stream=ndjson")
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        self.assertEqual([json.loads(line) for line in lines], paginated)
+
+    def test_model_list_query_count_is_constant(self):
+        def count_queries():
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get("/detail/catalog/")
+            return len(queries.captured_queries)
+
+        single = count_queries()
+        with self.captureOnCommitCallbacks(execute=True):
+            for pk in range(2, 7):
+                catalog = Catalog.objects.create(id=pk, name=f"Catalogue {pk}")
+                catalog.products.set([self.product])
+                catalog.attributes.set([self.attribute])
+
+        self.assertEqual(count_queries(), single)
+
     def test_model_detail_get(self):
         url = "/detail/catalog/1/"
         response = self.client.get(url)
@@ -294,3 +388,841 @@ class APIViewTest(TestCase):
 
         self.assertEqual(len(catalogue["products_ids"]), 1)
         self.assertEqual(catalogue["nazev"], "Catalogue 2024")
+
+    def test_bulk_post(self):
+        bulk_data = [
+            {"AttributeName": {"id": 1, "nazev": "Size", "zobrazit": True, "kod": "05"}},
+            {"AttributeName": {"id": 2, "nazev": "Weight", "zobrazit": False}},
+            {"AttributeName": {"id": 3, "nazev": "Weight"}},
+            {"AttributeValue": {"id": 2}},
+            {"Catalog": {"id": 1, "products_ids": [], "attributes_ids": [1]}},
+            {"Stock": {"id": 1}},
+        ]
+        response = self.client.post(
+            f"{self.url}?mode=bulk",
+            data=json.dumps(bulk_data),
+            content_type="application/json",
+        )
+        data = response.json()["received"]
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(data["created_or_updated"]), 3)
+        self.assertEqual(len(data["invalid_data"]), 2)
+        self.assertEqual(data["unknown_models"], [{"Stock": {"id": 1}}])
+        self.assertEqual(AttributeName.objects.get(id=1).name, "Size")
+        self.assertEqual(AttributeName.objects.get(id=2).name, "Weight")
+        self.assertFalse(AttributeName.objects.filter(id=3).exists())
+        self.assertEqual(self.catalog.products.count(), 0)
+        self.assertEqual(self.catalog.attributes.count(), 1)
+        self.assertEqual(data["created_or_updated"][2]["Catalog"]["products_ids"], [])
+
+    def test_dependency_ordered_post(self):
+        unordered_data = [
+            {"ProductAttributes": {"id": 2, "attribute": 2, "product": 1}},
+            {"Attribute": {"id": 2, "nazev_atributu_id": 2, "hodnota_atributu_id": 2}},
+            {"AttributeValue": {"id": 2, "hodnota": "M"}},
+            {"AttributeName": {"id": 2, "nazev": "Size"}},
+        ]
+        data, status_code = self._perform_post(unordered_data)
+
+        self.assertEqual(status_code, status.HTTP_200_OK)
+        self.assertEqual(data["invalid_data"], [])
+        self.assertEqual(
+            [next(iter(record)) for record in data["created_or_updated"]],
+            ["AttributeName", "AttributeValue", "Attribute", "ProductAttributes"],
+        )
+        self.assertEqual(ProductAttributes.objects.get(id=2).attribute_id, 2)
+
+    def test_related_objects_resolved_in_bulk(self):
+        Product.objects.create(id=2, name="Tablet", description="Big", price=10)
+        feed = [
+            {"ProductAttributes": {"id": pk, "attribute": 1, "product": product}}
+            for pk, product in [(2, 1), (3, 2), (4, 2), (5, 1)]
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            data, status_code = self._perform_post(feed)
+
+        selects = [
+            query["sql"]
+            for query in queries.captured_queries
+            if query["sql"].startswith("SELECT")
+            and ('"eshop_attribute"' in query["sql"] or '"eshop_product"' in query["sql"])
+        ]
+        self.assertEqual(len(data["created_or_updated"]), 4)
+        # One per referenced model, then one each for the products and their
+        # attributes when the touched product documents are rebuilt
+        self.assertEqual(len(selects), 4)
+
+    @override_settings(IMPORT_STREAM_CHUNK_SIZE=2)
+    def test_streaming_post(self):
+        feed = [
+            {"AttributeValue": {"id": pk, "hodnota": f"value-{pk}"}} for pk in range(2, 7)
+        ]
+        response = self.client.post(
+            f"{self.url}?stream=1", data=json.dumps(feed), content_type="application/json"
+        )
+        data = response.json()["received"]
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(data["created_or_updated"], feed)
+        self.assertEqual(AttributeValue.objects.count(), 6)
+
+    def test_streaming_post_malformed(self):
+        response = self.client.post(
+            f"{self.url}?stream=1", data="{}", content_type="application/json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_summary_report(self):
+        feed = [
+            {"AttributeValue": {"id": 1, "hodnota": "red"}},
+            {"AttributeValue": {"id": 2, "hodnota": "blue"}},
+            {"AttributeName": {"id": 1, "nazev": "Size"}},
+            {"Catalog": {"id": 1, "products_ids": [1], "attributes_ids": [1]}},
+            {"Attribute": {"id": 2, "nazev_atributu_id": 9, "hodnota_atributu_id": 1}},
+            {"Stock": {"id": 1}},
+        ]
+        for mode in ("row", "bulk"):
+            with self.subTest(mode=mode):
+                response = self.client.post(
+                    f"{self.url}?mode={mode}&report=summary",
+                    data=json.dumps(feed),
+                    content_type="application/json",
+                )
+                data = response.json()["received"]
+                AttributeValue.objects.filter(id=2).delete()
+                self.attribute_name.save()
+
+                self.assertEqual(
+                    data["summary"]["AttributeValue"],
+                    {"created": 1, "updated": 0, "unchanged": 1, "invalid": 0},
+                )
+                self.assertEqual(data["summary"]["AttributeName"]["updated"], 1)
+                self.assertEqual(data["summary"]["Catalog"]["unchanged"], 1)
+                self.assertEqual(data["invalid_data"][0]["model"], "Attribute")
+                self.assertEqual(data["invalid_data"][0]["id"], 2)
+                self.assertIn("nazev_atributu_id", data["invalid_data"][0]["error"])
+                self.assertEqual(data["unknown_models"], {"Stock": 1})
+                self.assertNotIn("created_or_updated", data)
+
+    def test_ndjson_report(self):
+        feed = [
+            {"AttributeValue": {"id": 2, "hodnota": "blue"}},
+            {"AttributeValue": {"id": 3}},
+        ]
+        response = self.client.post(
+            f"{self.url}?report=ndjson",
+            data=json.dumps(feed),
+            content_type="application/json",
+        )
+        lines = [
+            json.loads(line)
+            for line in b"".join(response.streaming_content).decode().splitlines()
+        ]
+
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(lines[0]["id"], 3)
+        self.assertEqual(lines[1]["summary"]["AttributeValue"]["created"], 1)
+
+    @override_settings(IMPORT_JOB_WORKERS=0)
+    def test_async_import_job(self):
+        feed = [
+            {"AttributeValue": {"id": 2, "hodnota": "blue"}},
+            {"AttributeValue": {"id": 3}},
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                f"{self.url}?async=1",
+                data=json.dumps(feed),
+                content_type="application/json",
+            )
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+
+        job = self.client.get(response.json()["url"]).json()
+        self.assertEqual(job["status"], ImportJob.FINISHED)
+        self.assertEqual((job["total"], job["processed"]), (2, 2))
+        self.assertEqual(job["result"]["summary"]["AttributeValue"]["created"], 1)
+        self.assertEqual(job["result"]["invalid_data"][0]["id"], 3)
+        self.assertIsNone(ImportJob.objects.get(id=job["id"]).payload)
+
+    def test_recover_stale_import_jobs(self):
+        feed = [{"AttributeValue": {"id": 2, "hodnota": "blue"}}]
+        long_ago = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        running, pending, live = (
+            ImportJob.objects.create(status=status, payload=feed, total=1)
+            for status in (ImportJob.RUNNING, ImportJob.PENDING, ImportJob.RUNNING)
+        )
+        ImportJob.objects.exclude(pk=live.pk).update(updated_on=long_ago)
+
+        call_command("recover_import_jobs", stdout=io.StringIO())
+
+        for job in (running, pending):
+            job.refresh_from_db()
+            self.assertEqual(job.status, ImportJob.FINISHED)
+        live.refresh_from_db()
+        self.assertEqual(live.status, ImportJob.RUNNING)
+        self.assertEqual(AttributeValue.objects.get(id=2).value, "blue")
+
+        ImportJob.objects.filter(pk=live.pk).update(updated_on=long_ago)
+        call_command("recover_import_jobs", "--fail", stdout=io.StringIO())
+
+        live.refresh_from_db()
+        self.assertEqual(live.status, ImportJob.FAILED)
+        self.assertIsNone(live.payload)
+
+    def test_import_progress_reported_per_chunk(self):
+        feed = [{"AttributeValue": {"id": pk, "hodnota": f"v{pk}"}} for pk in range(2, 7)]
+
+        for importer_class in (ModelImporter, BulkImporter):
+            progress = []
+            importer = importer_class(
+                batch_size=2,
+                report="summary",
+                progress=lambda importer: progress.append(importer.processed),
+            )
+            importer.run(json.loads(json.dumps(feed)))
+            AttributeValue.objects.filter(id__gt=1).delete()
+
+            self.assertEqual(progress, [2, 4, 5])
+
+    def test_false_flags(self):
+        response = self.client.post(
+            f"{self.url}?async=0&stream=false&natural_keys=no",
+            data=json.dumps([{"AttributeValue": {"id": 2, "hodnota": "blue"}}]),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(ImportJob.objects.count(), 0)
+
+        response = self.client.post(
+            f"{self.url}?async=maybe",
+            data=json.dumps([{"AttributeValue": {"id": 3, "hodnota": "green"}}]),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("async", response.json())
+
+    def test_chunked_commit_isolates_bad_rows(self):
+        feed = [
+            {"AttributeValue": {"id": 2, "hodnota": "blue"}},
+            {"AttributeValue": {"id": 3, "hodnota": "red"}},
+            {"AttributeValue": {"id": 4, "hodnota": "green"}},
+        ]
+        response = self.client.post(
+            f"{self.url}?batch_size=2",
+            data=json.dumps(feed),
+            content_type="application/json",
+        )
+        data = response.json()["received"]
+
+        self.assertEqual(len(data["created_or_updated"]), 2)
+        self.assertEqual(data["invalid_data"][0]["AttributeValue"]["id"], 3)
+        self.assertIn("error", data["invalid_data"][0]["AttributeValue"])
+        self.assertEqual(
+            list(AttributeValue.objects.order_by("id").values_list("id", flat=True)),
+            [1, 2, 4],
+        )
+
+    def test_invalid_batch_size(self):
+        for batch_size in ("0", "-1", "x", "%C2%B2"):
+            response = self.client.post(
+                f"{self.url}?batch_size={batch_size}",
+                data="[]",
+                content_type="application/json",
+            )
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn("batch_size", response.json())
+
+    def test_unchanged_rows_skipped_by_fingerprint(self):
+        feed = [
+            {"Attribute": {"id": 2, "nazev_atributu_id": 1, "hodnota_atributu_id": 1}},
+            {"Attribute": {"id": 3, "hodnota_atributu_id": 1, "nazev_atributu_id": 1}},
+        ]
+        self._perform_post(feed)
+
+        with CaptureQueriesContext(connection) as queries:
+            data, status_code = self._perform_post(feed)
+
+        self.assertEqual(len(data["created_or_updated"]), 2)
+        self.assertFalse(
+            any(
+                '"eshop_attributename"' in query["sql"]
+                for query in queries.captured_queries
+            )
+        )
+
+        # Deleting a row drops its fingerprint so the next feed restores it
+        Attribute.objects.get(id=3).delete()
+        self._perform_post(feed)
+        self.assertTrue(Attribute.objects.filter(id=3).exists())
+
+    def test_deleted_link_restored_by_fingerprinted_feed(self):
+        feed = [
+            {
+                "Product": {
+                    "id": 2,
+                    "nazev": "Tablet",
+                    "description": "Big",
+                    "cena": "10.00",
+                    "mena": "CZK",
+                }
+            },
+            {
+                "Catalog": {
+                    "id": 1,
+                    "nazev": "Catalogue 2024",
+                    "obrazek_id": 1,
+                    "products_ids": [1, 2],
+                    "attributes_ids": [1],
+                }
+            },
+        ]
+
+        for mode in ("row", "bulk"):
+            self.client.post(
+                f"{self.url}?mode={mode}",
+                data=json.dumps(feed),
+                content_type="application/json",
+            )
+            # Deleting the product drops its catalog link without m2m_changed
+            Product.objects.get(id=2).delete()
+            self.client.post(
+                f"{self.url}?mode={mode}",
+                data=json.dumps(feed),
+                content_type="application/json",
+            )
+
+            self.assertEqual(
+                sorted(self.catalog.products.values_list("id", flat=True)), [1, 2]
+            )
+
+    def test_fingerprints_fast_deleted(self):
+        ImportFingerprint.objects.create(model_name="Image", object_id=1, digest="")
+
+        with self.assertNumQueries(1):
+            ImportFingerprint.objects.filter(model_name="Image").delete()
+        with self.assertNumQueries(1):
+            Catalog.products.through.objects.filter(catalog=1).delete()
+
+    def test_fingerprinted_rows_reported_like_written_ones(self):
+        feed = [
+            {"Product": {"id": 2, "cena": "10", "mena": "CZK"}},
+            {"Product": {"id": 3, "nazev": "Tablet", "cena": "5.5", "mena": "EUR"}},
+        ]
+
+        with CaptureQueriesContext(connection) as queries:
+            first, status_code = self._perform_post(feed)
+        # The importer stores the fingerprints itself, saves do not drop them
+        self.assertFalse(
+            any(
+                query["sql"].startswith('DELETE FROM "eshop_importfingerprint"')
+                for query in queries.captured_queries
+            )
+        )
+
+        second, status_code = self._perform_post(feed)
+        self.assertEqual(first["created_or_updated"], second["created_or_updated"])
+        self.assertEqual(second["created_or_updated"][0]["Product"]["cena"], "10.00")
+
+    def test_model_detail_single_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get("/detail/product/1/")
+        self.assertEqual(response.json()["nazev"], "Phone")
+
+    def test_model_detail_empty_table(self):
+        ProductImage.objects.all().delete()
+        response = self.client.get("/detail/productimage/1/")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        response = self.client.get("/detail/stock/1/")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_registry_lookup(self):
+        entry = get_registry_entry("PRODUCTATTRIBUTES")
+        obj = entry.get_queryset().get(id=1)
+
+        self.assertIs(entry.model, ProductAttributes)
+        self.assertIs(entry.serializer_class, ProductAttributesSeralizer)
+        self.assertEqual(
+            get_deserialized_object(obj), {"id": 1, "attribute": 1, "product": 1}
+        )
+        self.assertIsNone(get_registry_entry("importjob"))
+
+    def test_detail_cache_invalidated_by_bulk_import(self):
+        url = "/detail/attributevalue/1/"
+        self.assertEqual(self.client.get(url)["X-Cache"], "MISS")
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response["X-Cache"], "HIT")
+
+        feed = [{"AttributeValue": {"id": 1, "hodnota": "blue"}}]
+        self.client.post(
+            f"{self.url}?mode=bulk", data=json.dumps(feed), content_type="application/json"
+        )
+        response = self.client.get(url)
+
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.json()["hodnota"], "blue")
+        self.assertEqual(
+            self.client.get("/cache/stats/").json(), {"hits": 1, "misses": 2}
+        )
+
+    def test_list_cache_invalidated_by_m2m_dependency_delete(self):
+        self.assertEqual(self.client.get("/detail/catalog/")["X-Cache"], "MISS")
+        self.assertEqual(self.client.get("/detail/catalog/")["X-Cache"], "HIT")
+        self.assertEqual(self.client.get("/detail/catalog/1/")["X-Cache"], "MISS")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.delete()
+        page = self.client.get("/detail/catalog/")
+        detail = self.client.get("/detail/catalog/1/")
+
+        self.assertEqual(page["X-Cache"], "MISS")
+        self.assertEqual(page.json()["results"][0]["products_ids"], [])
+        self.assertEqual(detail.json()["products_ids"], [])
+
+    def test_cache_invalidated_only_on_commit(self):
+        url = "/detail/product/1/"
+        self.assertEqual(self.client.get(url)["X-Cache"], "MISS")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = "Smartphone"
+            self.product.save()
+            # Not committed yet: the cached read stays in place
+            self.assertEqual(self.client.get(url)["X-Cache"], "HIT")
+
+        response = self.client.get(url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.json()["nazev"], "Smartphone")
+
+    def test_last_modified_moves_on_within_the_same_second(self):
+        url = "/detail/product/1/"
+        last_modified = self.client.get(url)["Last-Modified"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = "Smartphone"
+            self.product.save()
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["nazev"], "Smartphone")
+
+    def test_conditional_get(self):
+        url = "/detail/product/1/"
+        response = self.client.get(url)
+        etag, last_modified = response["ETag"], response["Last-Modified"]
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        list_response = self.client.get("/detail/product/")
+        self.assertNotEqual(list_response["ETag"], etag)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = "Smartphone"
+            self.product.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["nazev"], "Smartphone")
+
+    def test_sparse_fieldsets(self):
+        with CaptureQueriesContext(connection) as queries:
+            page = self.client.get("/detail/product/?fields=nazev,id").json()
+        page_sql = queries.captured_queries[-1]["sql"]
+        detail = self.client.get("/detail/catalog/1/?fields=products_ids").json()
+        response = self.client.get("/detail/product/1/?fields=nazev,stock")
+
+        self.assertEqual(page["results"], [{"id": 1, "nazev": "Phone"}])
+        self.assertNotIn("description", page_sql)
+        self.assertEqual(detail, {"products_ids": [1]})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_list_filtering_and_ordering(self):
+        Product.objects.create(
+            id=2, name="Tablet", description="Big", price=500, is_published=True
+        )
+        ProductAttributes.objects.create(id=2, attribute=self.attribute, product_id=2)
+        self.catalog.products.add(2)
+
+        def get_ids(query):
+            response = self.client.get(f"/detail/product/?{query}")
+            return [obj["id"] for obj in response.json()["results"]]
+
+        self.assertEqual(get_ids("is_published=true&currency=CZK"), [2])
+        self.assertEqual(get_ids("price__gte=600"), [1])
+        self.assertEqual(get_ids("published_on__lte=2023-01-01T00:00"), [1])
+        self.assertEqual(get_ids("catalog=1"), [1, 2])
+        self.assertEqual(get_ids("attribute_name=Color&attribute_value=red"), [1, 2])
+        self.assertEqual(get_ids("attribute_name=Color&attribute_value=blue"), [])
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(get_ids("ordering=price&fields=id,nazev"), [2, 1])
+        self.assertEqual(len(queries), 2)
+        self.assertEqual(get_ids("ordering=-id&page_size=1"), [2])
+
+        for query in ("price__gte=cheap", "ordering=description"):
+            response = self.client.get(f"/detail/product/?{query}")
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_filtered_list_follows_related_models(self):
+        Product.objects.create(id=2, name="Tablet", description="Big", price=10)
+        urls = ["/detail/product/?catalog=1", "/detail/product/?attribute_value=blue"]
+        etags = [self.client.get(url)["ETag"] for url in urls]
+        unfiltered = self.client.get("/detail/product/")
+        self.assertEqual(self.client.get(urls[0])["X-Cache"], "HIT")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.catalog.products.add(2)
+            self.attribute_value.value = "blue"
+            self.attribute_value.save()
+
+        for url, etag in zip(urls, etags):
+            response = self.client.get(url, headers={"If-None-Match": etag})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response["X-Cache"], "MISS")
+        results = self.client.get(urls[0]).json()["results"]
+        self.assertEqual([product["id"] for product in results], [1, 2])
+
+        # Lists that filter on nothing related keep their cached page
+        response = self.client.get(
+            "/detail/product/", headers={"If-None-Match": unfiltered["ETag"]}
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_attribute_facets(self):
+        Product.objects.create(id=2, name="Tablet", description="Big", price=500)
+        AttributeValue.objects.create(id=2, value="blue")
+        Attribute.objects.create(id=2, attribute_name_id=1, attribute_value_id=2)
+        ProductAttributes.objects.create(id=2, attribute_id=2, product_id=2)
+        ProductAttributes.objects.create(id=3, attribute_id=1, product_id=2)
+
+        response = self.client.get("/facets/?fields=id")
+        filtered = self.client.get("/facets/?attribute_value=blue&fields=id").json()
+
+        self.assertEqual(response.json()["results"], [{"id": 1}, {"id": 2}])
+        self.assertEqual(
+            response.json()["facets"],
+            [
+                {
+                    "attribute_name": 1,
+                    "name": "Color",
+                    "values": [
+                        {"attribute_value": 2, "value": "blue", "count": 1},
+                        {"attribute_value": 1, "value": "red", "count": 2},
+                    ],
+                }
+            ],
+        )
+        self.assertEqual(filtered["results"], [{"id": 2}])
+        self.assertEqual(
+            [value["count"] for value in filtered["facets"][0]["values"]], [1, 1]
+        )
+
+    def test_product_document(self):
+        url = "/documents/product/1/"
+        document = self.client.get(url).json()
+
+        self.assertEqual(document["nazev"], "Phone")
+        self.assertEqual(
+            document["attributes"], [{"id": 1, "nazev": "Color", "hodnota": "red"}]
+        )
+        self.assertEqual(document["images"][0]["nazev"], "new-phone")
+        self.assertEqual(document["catalogs"], [{"id": 1, "nazev": "Catalogue 2024"}])
+        self.assertTrue(ProductDocument.objects.filter(product_id=1).exists())
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        self.assertEqual(len(queries), 1)
+
+        self.client.post(
+            "/import/?mode=bulk",
+            data=json.dumps([{"AttributeValue": {"id": 1, "hodnota": "blue"}}]),
+            content_type="application/json",
+        )
+        document = ProductDocument.objects.get(product_id=1).document
+        self.assertEqual(document["attributes"][0]["hodnota"], "blue")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.catalog.products.clear()
+        self.assertEqual(self.client.get(url).json()["catalogs"], [])
+        self.assertEqual(
+            self.client.get("/documents/product/9/").status_code,
+            status.HTTP_404_NOT_FOUND,
+        )
+
+    def test_import_resolves_document_products_per_batch(self):
+        feed = [
+            {"AttributeValue": {"id": pk, "hodnota": f"v{pk}"}} for pk in range(1, 6)
+        ]
+
+        with CaptureQueriesContext(connection) as queries:
+            self._perform_post(feed)
+
+        lookups = [
+            query
+            for query in queries.captured_queries
+            if query["sql"].startswith("SELECT")
+            and '"eshop_productattributes"' in query["sql"]
+        ]
+        # One finds the affected products, one reads their attributes
+        self.assertEqual(len(lookups), 2)
+
+    def test_product_search(self):
+        Product.objects.create(
+            id=2, name="Phone case", description="Fits a phone", price=10
+        )
+        Product.objects.create(id=3, name="Tablet", description="Big", price=500)
+        call_command("refresh_product_documents", stdout=io.StringIO())
+
+        def search(query):
+            response = self.client.get(f"/search/?q={query}")
+            return [document["id"] for document in response.json()["results"]]
+
+        self.assertEqual(search("phone"), [2, 1])
+        self.assertEqual(search("red"), [1])
+        self.assertEqual(search("tab"), [3])
+        self.assertEqual(search("phone case"), [2])
+        self.assertEqual(search('"OR*'), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                self.url,
+                data=json.dumps([{"AttributeValue": {"id": 1, "hodnota": "blue"}}]),
+                content_type="application/json",
+            )
+            Product.objects.filter(id=3).delete()
+        self.assertEqual(search("blue"), [1])
+        self.assertEqual(search("tablet"), [])
+        self.assertEqual(
+            self.client.get("/search/?q=").status_code, status.HTTP_400_BAD_REQUEST
+        )
+
+    def test_natural_key_upsert(self):
+        feed = [
+            {"AttributeName": {"id": 7, "nazev": "Color", "kod": "07"}},
+            {"AttributeValue": {"id": 8, "hodnota": "red"}},
+            {"Attribute": {"id": 9, "nazev_atributu_id": 7, "hodnota_atributu_id": 8}},
+            {"Image": {"id": 5, "obrazek": self.image.image}},
+            {"Product": {"id": 4, "nazev": "Phone", "mena": "EUR"}},
+            {"ProductImage": {"id": 6, "product": 4, "obrazek_id": 5}},
+            {"Catalog": {"id": 2, "nazev": "Outlet", "products_ids": [4]}},
+        ]
+
+        for query in ("?mode=bulk", "?mode=bulk&natural_keys=1", "?natural_keys=1"):
+            with self.subTest(query=query):
+                response = self.client.post(
+                    self.url + query,
+                    data=json.dumps(feed),
+                    content_type="application/json",
+                )
+                invalid_data = response.json()["received"]["invalid_data"]
+
+                if "natural_keys" not in query:
+                    self.assertEqual(len(invalid_data), 7)
+                    continue
+
+                self.assertEqual(invalid_data, [])
+                self.assertEqual(AttributeName.objects.get().code, "07")
+                self.assertEqual(
+                    Attribute.objects.filter(
+                        id=9, attribute_name_id=1, attribute_value_id=1
+                    ).count(),
+                    1,
+                )
+                self.assertEqual(
+                    ProductImage.objects.filter(id=6, product_id=1, image_id=1).count(),
+                    1,
+                )
+                catalog = Catalog.objects.get(id=2)
+                self.assertEqual([product.id for product in catalog.products.all()], [1])
+                self.assertFalse(Product.objects.filter(id=4).exists())
+
+    def test_natural_key_remap_forgets_target_fingerprint(self):
+        first = [{"AttributeName": {"id": 1, "nazev": "Color", "kod": "A"}}]
+        remapped = [{"AttributeName": {"id": 5, "nazev": "Color", "kod": "X"}}]
+
+        for mode in ("row", "bulk"):
+            with self.subTest(mode=mode):
+                for feed, query in ((first, ""), (remapped, "&natural_keys=1")):
+                    self.client.post(
+                        f"{self.url}?mode={mode}{query}",
+                        data=json.dumps(feed),
+                        content_type="application/json",
+                    )
+                self.assertEqual(AttributeName.objects.get(id=1).code, "X")
+
+                self.client.post(
+                    f"{self.url}?mode={mode}",
+                    data=json.dumps(first),
+                    content_type="application/json",
+                )
+                self.assertEqual(AttributeName.objects.get(id=1).code, "A")
+
+    def test_read_plan_matches_serializers(self):
+        Product.objects.create(id=2, name="Tablet", description="Big", price=10)
+        self.catalog.products.add(2)
+        renderer = JSONRenderer()
+
+        for key in ("product", "catalog", "attribute", "productimage"):
+            entry = get_registry_entry(key)
+            for fields in (None, tuple(entry.serializer_class.Meta.fields[-2:])):
+                with self.subTest(key=key, fields=fields):
+                    queryset = entry.get_queryset().order_by("id")
+                    expected = entry.serializer_class(
+                        queryset, many=True, fields=fields
+                    ).data
+                    plan = entry.get_read_plan(fields)
+
+                    self.assertEqual(
+                        renderer.render(plan.render(plan.values(queryset))),
+                        renderer.render(expected),
+                    )
+
+    def test_list_aggregates_m2m_ids(self):
+        Product.objects.create(id=2, name="Tablet", description="Big", price=10)
+        self.catalog.products.add(2)
+
+        # The ids come with the page: ARRAY_AGG on PostgreSQL, GROUP_CONCAT on SQLite
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/detail/catalog/")
+
+        self.assertEqual(len(queries), 2)
+        self.assertEqual(response.json()["results"][0]["products_ids"], [1, 2])
+        self.assertEqual(response.json()["results"][0]["attributes_ids"], [1])
+
+
+    def test_async_list_matches_sync_list(self):
+        for pk in range(2, 5):
+            Product.objects.create(id=pk, name=f"Phone {pk}", description="", price=pk)
+        self.catalog.products.add(2, 3)
+
+        for query in ("page_size=3", "page_size=2&ordering=-price"):
+            url = f"/detail/product/?{query}"
+            async_url = f"/async/detail/product/?{query}"
+            while url:
+                page = self.client.get(url).json()
+                async_page = self.client.get(async_url).json()
+                self.assertEqual(async_page["results"], page["results"])
+                url, async_url = page["next"], async_page["next"]
+                # Cursors are shared between both endpoints
+                if url:
+                    self.assertEqual(
+                        async_url, url.replace("/detail/", "/async/detail/")
+                    )
+            self.assertIsNone(async_url)
+
+        catalogs = self.client.get("/async/detail/catalog/").json()["results"]
+        self.assertEqual(catalogs, self.client.get("/detail/catalog/").json()["results"])
+
+        response = self.client.get("/async/detail/product/?ordering=stock")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("ordering", response.json())
+
+    async def test_async_detail(self):
+        cache_get = cache.get
+
+        def get_off_event_loop(*args, **kwargs):
+            with self.assertRaises(RuntimeError):
+                asyncio.get_running_loop()
+            return cache_get(*args, **kwargs)
+
+        with mock.patch.object(cache, "get", get_off_event_loop):
+            response = await self.async_client.get("/async/detail/catalog/1/")
+            await self.async_client.get("/async/detail/catalog/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.has_header("Last-Modified"))
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.json()["products_ids"], [1])
+
+        response = await self.async_client.get("/async/detail/catalog/1/")
+        self.assertEqual(response["X-Cache"], "HIT")
+
+        response = await self.async_client.get(
+            "/async/detail/catalog/1/", headers={"If-None-Match": response["ETag"]}
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        page = await self.async_client.get("/async/detail/product/")
+        response = await self.async_client.get("/async/detail/product/?stream=json")
+        content = b"".join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(json.loads(content), page.json()["results"])
+
+        response = await self.async_client.get("/async/detail/catalog/2/")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = await self.async_client.get("/async/detail/stock/1/")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = await self.async_client.post("/async/detail/catalog/1/")
+        self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+
+class StreamingParserTest(SimpleTestCase):
+
+    def test_items_split_across_blocks(self):
+        items = [{"Product": {"id": i, "nazev": "Čaj" * i}} for i in range(20)] + [42]
+        raw = json.dumps(items, ensure_ascii=False).encode()
+
+        for read_size in (1, 3, 64, 4096):
+            stream = iter_json_array(io.BytesIO(raw), read_size=read_size)
+            self.assertEqual(list(stream), items)
+
+    def test_invalid_arrays(self):
+        for raw in (b"", b"{}", b"[1,]", b"[1 2]", b"[1]x", b"[1"):
+            with self.assertRaises(ParseError):
+                list(iter_json_array(io.BytesIO(raw), read_size=2))
+
+
+    def test_invalid_item_rejected_without_reading_on(self):
+        raw = b"[{bad}," + b",".join([b'{"Product": {"id": 1}}'] * 10000) + b"]"
+        stream = io.BytesIO(raw)
+
+        with self.assertRaises(ParseError):
+            list(iter_json_array(stream, read_size=64))
+        self.assertEqual(stream.tell(), 64)
+
+    def test_item_size_capped(self):
+        raw = json.dumps([{"id": 1}, {"nazev": "x" * 100}]).encode()
+
+        with self.assertRaises(ParseError):
+            list(iter_json_array(io.BytesIO(raw), read_size=8, max_item_size=50))
+        self.assertEqual(
+            len(list(iter_json_array(io.BytesIO(raw), read_size=8, max_item_size=200))),
+            2,
+        )
+
+class ORJSONTest(SimpleTestCase):
+
+    def test_renders_like_drf(self):
+        data = [
+            OrderedDict(id=1, nazev="Čaj\u2028", cena="10.00", ids=[1, 2]),
+            {
+                "published_on": datetime(2022, 12, 12, 8, 30, 1, 5, tzinfo=timezone.utc),
+                "naive": datetime(2022, 12, 12),
+                "price": Decimal("1.5"),
+                "none": None,
+                1: True,
+            },
+        ]
+        expected = JSONRenderer().render(data)
+
+        self.assertEqual(ORJSONRenderer().render(data), expected)
+        self.assertEqual(
+            ORJSONRenderer().render(data, "application/json; indent=2"),
+            JSONRenderer().render(data, "application/json; indent=2"),
+        )
+        with mock.patch("eshop.renderers.orjson", None):
+            self.assertEqual(ORJSONRenderer().render(data), expected)
+
+    def test_parses_like_drf(self):
+        body = json.dumps([{"Product": {"id": 1, "nazev": "Čaj"}}]).encode()
+
+        self.assertEqual(
+            ORJSONParser().parse(io.BytesIO(body)), json.loads(body.decode())
+        )
+        with self.assertRaises(ParseError):
+            ORJSONParser().parse(io.BytesIO(b"[{"))
@@ -6,6 +6,17 @@ app_name = "eshop"
 
 urlpatterns = [
     path("import/", views.ImportAPIView.as_view()),
+    path(
+        "import/<int:job_id>/", views.ImportJobAPIView.as_view(), name="import_job"
+    ),
+    path(
+        "documents/product/<int:pk>/",
+        views.ProductDocumentAPIView.as_view(),
+        name="product_document",
+    ),
+    path("search/", views.SearchAPIView.as_view(), name="search"),
+    path("facets/", views.FacetAPIView.as_view(), name="facets"),
+    path("cache/stats/", views.CacheStatsAPIView.as_view(), name="cache_stats"),
     path(
         "detail/<str:model_name>/", views.ModelListAPIView.as_view(), name="object_list"
     ),
@@ -14,4 +25,13 @@ urlpatterns = [
         views.ModelDetailAPIView.as_view(),
         name="object_detail",
     ),
+    # Native async variants of the read endpoints for ASGI deployments
+    path(
+        "async/detail/<str:model_name>/", views.model_list, name="async_object_list"
+    ),
+    path(
+        "async/detail/<str:model_name>/<int:pk>/",
+        views.model_detail,
+        name="async_object_detail",
+    ),
 ]
@@ -1,11 +1,19 @@
+from graphlib import TopologicalSorter
+from typing import NamedTuple
+
 from django.apps import apps
+from django.conf import settings
 from django.db import IntegrityError
+from django.db.models import Model
+from django.db.models.query import QuerySet
 from django.forms.models import model_to_dict
 from rest_framework import status
 from rest_framework.serializers import ModelSerializer
 from rest_framework.utils.serializer_helpers import ReturnDict
 from rest_framework.response import Response
 
+from .readers import ReadPlan, get_read_plan
+from .renderers import ORJSONRenderer
 from .serializers import (
     AttributeNameSerializer,
     AttributeValueSerializer,
@@ -51,13 +59,28 @@ models = {
 APP_NAME = "eshop"
 
 
+class RegistryEntry(NamedTuple):
+    key: str
+    model: type[Model]
+    serializer_class: type[ModelSerializer]
+    queryset: QuerySet
+
+    def get_queryset(self) -> QuerySet:
+        """Return a fresh clone of the base queryset; the read plan picks the
+        columns it needs."""
+        return self.queryset.all()
+
+    def get_read_plan(self, fields: tuple[str, ...] | None = None) -> ReadPlan:
+        return get_read_plan(self.serializer_class, fields)
+
+
 def get_app_models():
     """Get all models' names in the given application."""
     return apps.get_app_config(APP_NAME).get_models()
 
 
 def get_app_model(model_name: str):
-    return next(filter(lambda model: model.__name__ == model_name, get_app_models()))
+    return models.get(model_name)
 
 
 def serialize_data(data: dict, serializer_class: ModelSerializer):
@@ -71,13 +94,34 @@ def serialize_data(data: dict, serializer_class: ModelSerializer):
     return False
 
 
+def build_registry() -> dict[str, RegistryEntry]:
+    """Map every catalogue model by its lowercase name to its model class,
+    serializer class and base queryset."""
+    return {
+        key.lower(): RegistryEntry(
+            key, model, model_serializers_mapping[key], model.objects.all()
+        )
+        for key, model in models.items()
+    }
+
+
+registry = build_registry()
+serializers_by_model = {
+    entry.model: entry.serializer_class for entry in registry.values()
+}
+
+
+def get_registry_entry(model_name: str) -> RegistryEntry | None:
+    """Find a catalogue model by its case-insensitive name."""
+    return registry.get(model_name.lower())
+
+
 def filter_models(model_name: str):
     """Find and retrieve models by name."""
-    app_models = apps.get_app_config(APP_NAME).get_models()
+    entry = get_registry_entry(model_name)
 
-    for model in app_models:
-        if model.__name__.lower() == model_name.lower():
-            return model.objects.all()
+    if entry is not None:
+        return entry.get_queryset()
 
     return Response(
         {"error": f"No model with name '{model_name}' was found"},
@@ -85,10 +129,91 @@ def filter_models(model_name: str):
     )
 
 
-def get_deserialized_object(obj: object) -> ReturnDict:
-    for key, value in models.items():
-        if isinstance(obj, value):
-            return model_serializers_mapping[key](obj).data
+def get_import_order() -> dict[str, int]:
+    """Rank model keys so that every model follows the models it references."""
+    graph = {
+        key: {
+            field.related_model.__name__
+            for field in [*model._meta.fields, *model._meta.many_to_many]
+            if field.is_relation
+        }
+        for key, model in models.items()
+    }
+    order = TopologicalSorter(graph).static_order()
+    return {key: rank for rank, key in enumerate(order)}
+
+
+IMPORT_ORDER = get_import_order()
+
+
+def get_deserialized_object(
+    obj: object, fields: tuple[str, ...] | None = None
+) -> ReturnDict:
+    return serializers_by_model[type(obj)](obj, fields=fields).data
+
+
+def iter_streamed_objects(
+    queryset: QuerySet,
+    stream_format: str = "json",
+    fields: tuple[str, ...] | None = None,
+):
+    """Serialize a queryset row by row into a JSON array or NDJSON lines.
+    An already ordered queryset keeps its ordering."""
+    renderer = ORJSONRenderer()
+    plan = get_read_plan(serializers_by_model[queryset.model], fields)
+    if not queryset.ordered:
+        queryset = queryset.order_by("id")
+    rows = plan.values(queryset).iterator(chunk_size=settings.LIST_STREAM_CHUNK_SIZE)
+    objects = plan.iter_render(rows, settings.LIST_STREAM_CHUNK_SIZE)
+
+    if stream_format == "ndjson":
+        for obj in objects:
+            yield renderer.render(obj) + b"\n"
+        return
+
+    separator = b"["
+    for obj in objects:
+        yield separator + renderer.render(obj)
+        separator = b","
+
+    yield b"[]" if separator == b"[" else b"]"
+
+
+async def aiter_streamed_objects(
+    queryset: QuerySet,
+    stream_format: str = "json",
+    fields: tuple[str, ...] | None = None,
+):
+    """Async variant of iter_streamed_objects reading rows with aiterator()."""
+    renderer = ORJSONRenderer()
+    plan = get_read_plan(serializers_by_model[queryset.model], fields)
+    if not queryset.ordered:
+        queryset = queryset.order_by("id")
+    rows = plan.values(queryset).aiterator(chunk_size=settings.LIST_STREAM_CHUNK_SIZE)
+    separator = b"["
+    chunk = []
+
+    async def render_chunk():
+        nonlocal separator
+        for obj in await plan.arender(chunk):
+            if stream_format == "ndjson":
+                yield renderer.render(obj) + b"\n"
+            else:
+                yield separator + renderer.render(obj)
+                separator = b","
+        chunk.clear()
+
+    async for row in rows:
+        chunk.append(row)
+        if len(chunk) == settings.LIST_STREAM_CHUNK_SIZE:
+            async for line in render_chunk():
+                yield line
+
+    async for line in render_chunk():
+        yield line
+
+    if stream_format != "ndjson":
+        yield b"[]" if separator == b"[" else b"]"
 
 
 def get_serializer_model(key: str) -> ModelSerializer:
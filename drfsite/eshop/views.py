@@ -1,110 +1,486 @@
-from django.db import IntegrityError
-from django.http import HttpRequest
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import Http404, HttpRequest, HttpResponse, StreamingHttpResponse
 from django.core.exceptions import ObjectDoesNotExist
 from django.db.models.query import QuerySet
 from django.shortcuts import get_object_or_404
-from rest_framework.utils.serializer_helpers import ReturnDict
+from django.urls import reverse
+from django.utils.decorators import method_decorator
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+from django.views.decorators.http import condition, require_safe
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework.parsers import JSONParser
-from rest_framework import status
+from rest_framework import serializers, status
 
 
+from .cache import (
+    get_cached,
+    get_detail_cache_key,
+    get_etag,
+    get_last_modified,
+    get_list_cache_key,
+    get_stats,
+    read_cached,
+    set_cached,
+)
+from .importers import BulkImporter, ModelImporter, iter_ndjson_report
+from .jobs import create_import_job
+from .documents import get_product_document
+from .filters import (
+    filter_queryset,
+    get_attribute_facets,
+    get_filter_dependencies,
+    get_order_by,
+    get_ordering,
+    order_queryset,
+)
+from .models import ImportJob
+from .pagination import ModelLimitOffsetPagination, get_async_paginator, get_paginator
+from .parsers import ORJSONParser, StreamingJSONParser
+from .renderers import ORJSONRenderer
+from .search import search_products
+from .serializers import ImportJobSerializer
 from .utils import (
+    aiter_streamed_objects,
     filter_models,
-    get_deserialized_object,
-    get_serializer_model,
-    get_app_models,
+    get_registry_entry,
+    iter_streamed_objects,
 )
 
-app_models = [model.__name__ for model in get_app_models()]
+
+STREAM_CONTENT_TYPES = {"json": "application/json", "ndjson": "application/x-ndjson"}
+
+
+def get_batch_size(request) -> int | None:
+    """Read the optional number of rows committed per transaction."""
+    batch_size = request.query_params.get("batch_size")
+
+    if batch_size is None:
+        return None
+
+    try:
+        return serializers.IntegerField(min_value=1).run_validation(batch_size)
+    except ValidationError as exc:
+        raise ValidationError({"batch_size": exc.detail})
+
+
+def get_flag(request, name: str) -> bool:
+    """Read an optional boolean query parameter such as ?async=1."""
+    value = request.query_params.get(name)
+
+    if value is None:
+        return False
+
+    try:
+        return serializers.BooleanField().to_internal_value(value)
+    except ValidationError as exc:
+        raise ValidationError({name: exc.detail})
+
+
+def get_requested_fields(request, model_name: str) -> tuple[str, ...] | None:
+    """Read the optional comma-separated list of output fields."""
+    fields = request.query_params.get("fields")
+    entry = get_registry_entry(model_name)
+
+    if fields is None or entry is None:
+        return None
+
+    requested = tuple(sorted({name.strip() for name in fields.split(",")} - {""}))
+    unknown = set(requested) - set(entry.serializer_class.Meta.fields)
+
+    if not requested or unknown:
+        raise ValidationError(
+            {"fields": f"Choose from: {', '.join(entry.serializer_class.Meta.fields)}."}
+        )
+
+    return requested
 
 
 class ImportAPIView(APIView):
     """Accept POST request with JSON content."""
 
-    parser_classes = [JSONParser]
+    parser_classes = [ORJSONParser]
 
     def post(self, request, format="json") -> Response:
-        saved_models, invalid_data, unknown_models = [], [], []
-        json_data = request.data
-
-        if not json_data:
-            return Response({"result": "No data provided"}, status=200)
-
-        # Iterate over dictionaries in JSON file
-        for data in json_data:
-            data_keys = data.keys()
-
-            # Iterate over keys in the dictionary
-            for key in data_keys:
-                if key not in app_models:
-                    unknown_models.append(data)
-                    continue
-
-                serializer_model = get_serializer_model(key)
-                serializer = serializer_model(data=data[key])
-
-                if not serializer.is_valid():
-                    object_data = data[key]
-                    object_data["error"] = serializer.errors
-                    invalid_data.append(data)
-                    continue
-
-                try:
-                    serializer.save()
-                except IntegrityError as e:
-                    object_data = data[key]
-                    object_data["error"] = str(e)
-                    invalid_data.append(data)
-                    continue
-
-                data[key] = serializer.data
-                saved_models.append(data)
-
-        return Response(
-            {
-                "received": {
-                    "created_or_updated": saved_models,
-                    "invalid_data": invalid_data,
-                    "unknown_models": unknown_models,
-                }
-            },
-            status=status.HTTP_200_OK,
+        stream = get_flag(request, "stream")
+        report = request.query_params.get("report", "full")
+        importer_class = (
+            BulkImporter if request.query_params.get("mode") == "bulk" else ModelImporter
         )
+        batch_size = get_batch_size(request)
+        natural_keys = get_flag(request, "natural_keys")
+        importer = importer_class(
+            batch_size=batch_size,
+            report="full" if report == "full" else "summary",
+            natural_keys=natural_keys,
+        )
+
+        # Parse the array item by item instead of loading the whole body
+        if stream:
+            if request.stream is None:
+                return Response({"result": "No data provided"}, status=200)
+            json_data = StreamingJSONParser().parse(request.stream)
+        else:
+            json_data = request.data
+
+            if not json_data:
+                return Response({"result": "No data provided"}, status=200)
+
+        # Persist the payload and let an import worker process it
+        if get_flag(request, "async"):
+            # Jobs keep the compact report unless the echo is asked for
+            job_report = request.query_params.get("report", "summary")
+            options = {
+                "mode": request.query_params.get("mode", "row"),
+                "report": "full" if job_report == "full" else "summary",
+                "batch_size": batch_size,
+                "natural_keys": natural_keys,
+            }
+            job = create_import_job(list(json_data), options)
+            return Response(
+                {
+                    "job_id": job.pk,
+                    "status": job.status,
+                    "url": reverse("eshop:import_job", args=[job.pk]),
+                },
+                status=status.HTTP_202_ACCEPTED,
+            )
+
+        result = importer.run_stream(json_data) if stream else importer.run(json_data)
+
+        if report == "ndjson":
+            return StreamingHttpResponse(
+                iter_ndjson_report(result), content_type="application/x-ndjson"
+            )
+
+        return Response({"received": result}, status=status.HTTP_200_OK)
 
 
+class ImportJobAPIView(APIView):
+    """Accept GET request and return the progress of an import job."""
+
+    def get(self, request: HttpRequest, job_id: int) -> Response:
+        job = get_object_or_404(ImportJob, id=job_id)
+        return Response(ImportJobSerializer(job).data)
+
+
+def get_list_dependencies(request, model_name: str, **kwargs) -> tuple[str, ...]:
+    """Lists filtered through relations also follow the related models."""
+    entry = get_registry_entry(model_name)
+    if entry is None or "pk" in kwargs:
+        return ()
+    return get_filter_dependencies(entry.model, request.GET)
+
+
+def get_model_etag(request, model_name: str, **kwargs) -> str | None:
+    entry = get_registry_entry(model_name)
+    if entry is None:
+        return None
+    return get_etag(
+        entry.key,
+        request.build_absolute_uri(),
+        request.META.get("HTTP_ACCEPT", ""),
+        get_list_dependencies(request, model_name, **kwargs),
+    )
+
+
+def get_model_last_modified(request, model_name: str, **kwargs):
+    entry = get_registry_entry(model_name)
+    if entry is None:
+        return None
+    return get_last_modified(
+        entry.key, get_list_dependencies(request, model_name, **kwargs)
+    )
+
+
+# Answer If-None-Match / If-Modified-Since with 304 before any query runs
+conditional_get = condition(
+    etag_func=get_model_etag, last_modified_func=get_model_last_modified
+)
+
+
+@method_decorator(conditional_get, name="get")
 class ModelListAPIView(APIView):
     """Accept GET request and return objects by model name."""
 
     def get(self, request: HttpRequest, model_name: str) -> Response:
+        fields = get_requested_fields(request, model_name)
         result: QuerySet | Response = filter_models(model_name)
 
         if isinstance(result, Response):
             return result
 
-        if not result:
+        ordering = get_ordering(result.model.__name__, request.query_params)
+
+        stream_format = request.query_params.get("stream")
+        cache_key = get_list_cache_key(
+            result.model.__name__,
+            request.build_absolute_uri(),
+            get_filter_dependencies(result.model, request.query_params),
+        )
+
+        if stream_format not in STREAM_CONTENT_TYPES:
+            data = get_cached(cache_key)
+            if data is not None:
+                return Response(data, headers={"X-Cache": "HIT"})
+
+        if not result.exists():
             return Response(
                 {"result": f"No objects of the '{model_name}' model found"}, status=404
             )
 
-        data = [get_deserialized_object(obj) for obj in result]
-        return Response(data, status=status.HTTP_200_OK)
+        # A filter matching nothing gives an empty page rather than a 404
+        result = order_queryset(filter_queryset(result, request.query_params), ordering)
+
+        # Emit the whole table row by row for full exports
+        if stream_format in STREAM_CONTENT_TYPES:
+            return StreamingHttpResponse(
+                iter_streamed_objects(result, stream_format, fields),
+                content_type=STREAM_CONTENT_TYPES[stream_format],
+            )
 
+        # Page over plain .values() rows, the cursor reads its position from them
+        plan = get_registry_entry(model_name).get_read_plan(fields)
+        rows = plan.values(result, ordering.lstrip("-"))
+        paginator = get_paginator(request, get_order_by(ordering))
+        page = paginator.paginate_queryset(rows, request, view=self)
 
+        response = paginator.get_paginated_response(plan.render(page))
+        set_cached(cache_key, response.data)
+        response["X-Cache"] = "MISS"
+        return response
+
+
+@method_decorator(conditional_get, name="get")
 class ModelDetailAPIView(APIView):
     """Accept GET request and return product details by it's model name and id."""
 
     def get(
         self, request: HttpRequest, model_name: str, pk: int, format="json"
     ) -> Response:
-        result: QuerySet | Response = filter_models(model_name)
+        entry = get_registry_entry(model_name)
 
-        if isinstance(result, Response):
-            return result
+        if entry is None:
+            return Response(
+                {"error": f"No model with name '{model_name}' was found"},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+
+        fields = get_requested_fields(request, model_name)
+        cache_key = get_detail_cache_key(entry.key, pk, fields)
+        serialized_model = get_cached(cache_key)
+        if serialized_model is not None:
+            return Response(serialized_model, headers={"X-Cache": "HIT"})
+
+        plan = entry.get_read_plan(fields)
+        rows = plan.render(plan.values(entry.model.objects.filter(id=pk)))
+
+        if not rows:
+            raise Http404
+
+        serialized_model = rows[0]
+        set_cached(cache_key, serialized_model)
+        return Response(serialized_model, headers={"X-Cache": "MISS"})
+
+
+class ProductDocumentAPIView(APIView):
+    """Accept GET request and return a product with its attributes, images and
+    catalogs from the denormalized product document."""
+
+    def get(self, request: HttpRequest, pk: int) -> Response:
+        document = get_product_document(pk)
+
+        if document is None:
+            return Response(
+                {"error": f"No product with id '{pk}' was found"},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+
+        return Response(document)
+
+
+class SearchAPIView(APIView):
+    """Accept GET request and return the product documents matching the
+    ?q= text, ranked by relevance."""
+
+    def get(self, request: HttpRequest) -> Response:
+        query = request.query_params.get("q", "").strip()
+
+        if not query:
+            raise ValidationError({"q": "A search text is required."})
+
+        paginator = ModelLimitOffsetPagination()
+        page = paginator.paginate_queryset(search_products(query), request, view=self)
+        return paginator.get_paginated_response([obj.document for obj in page])
+
+
+class FacetAPIView(APIView):
+    """Accept GET request and return the products matching the product filters
+    along with the attribute value counts among them."""
+
+    def get(self, request: HttpRequest) -> Response:
+        fields = get_requested_fields(request, "Product")
+        ordering = get_ordering("Product", request.query_params)
+        entry = get_registry_entry("Product")
+        products = filter_queryset(entry.get_queryset(), request.query_params)
+
+        plan = entry.get_read_plan(fields)
+        rows = plan.values(order_queryset(products, ordering), ordering.lstrip("-"))
+        paginator = get_paginator(request, get_order_by(ordering))
+        page = paginator.paginate_queryset(rows, request, view=self)
+
+        response = paginator.get_paginated_response(plan.render(page))
+        response.data["facets"] = get_attribute_facets(products)
+        return response
+
+
+class CacheStatsAPIView(APIView):
+    """Accept GET request and return the read cache hit and miss counters."""
+
+    def get(self, request: HttpRequest) -> Response:
+        return Response(get_stats())
+
+
+def json_response(data, status: int = 200, headers: dict | None = None) -> HttpResponse:
+    return HttpResponse(
+        ORJSONRenderer().render(data),
+        status=status,
+        content_type="application/json",
+        headers=headers,
+    )
+
+
+def api_exception_response(exc: APIException) -> HttpResponse:
+    # Same body as DRF's exception handler
+    data = exc.detail if isinstance(exc.detail, (list, dict)) else {"detail": exc.detail}
+    return json_response(data, status=exc.status_code)
+
+
+def get_validators(
+    request, model_name: str, **kwargs
+) -> tuple[str | None, int | None]:
+    etag = get_model_etag(request, model_name, **kwargs)
+    last_modified = get_model_last_modified(request, model_name, **kwargs)
+    return (
+        quote_etag(etag) if etag is not None else None,
+        int(last_modified.timestamp()) if last_modified is not None else None,
+    )
+
+
+def async_conditional_get(view):
+    """conditional_get for the async views: condition() would compute the
+    validators on the event loop, and they read the cache."""
+
+    @wraps(view)
+    async def inner(request: HttpRequest, *args, **kwargs) -> HttpResponse:
+        etag, last_modified = await sync_to_async(get_validators)(
+            request, *args, **kwargs
+        )
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = await view(request, *args, **kwargs)
+
+        if last_modified is not None and not response.has_header("Last-Modified"):
+            response.headers["Last-Modified"] = http_date(last_modified)
+        if etag is not None:
+            response.headers.setdefault("ETag", etag)
+        return response
+
+    return inner
+
+
+@require_safe
+@async_conditional_get
+async def model_list(request: HttpRequest, model_name: str) -> HttpResponse:
+    """Async variant of ModelListAPIView for ASGI servers, reading rows with
+    the async ORM. Pages are cursor based only and always rendered as JSON."""
+    request = Request(request)
+    entry = get_registry_entry(model_name)
+
+    if entry is None:
+        return json_response(
+            {"error": f"No model with name '{model_name}' was found"},
+            status=status.HTTP_404_NOT_FOUND,
+        )
+
+    try:
+        fields = get_requested_fields(request, model_name)
+        ordering = get_ordering(entry.key, request.query_params)
+        result = entry.get_queryset()
+
+        stream_format = request.query_params.get("stream")
+
+        if stream_format not in STREAM_CONTENT_TYPES:
+            cache_key, data = await sync_to_async(read_cached)(
+                get_list_cache_key,
+                entry.key,
+                request.build_absolute_uri(),
+                get_filter_dependencies(entry.model, request.query_params),
+            )
+            if data is not None:
+                return json_response(data, headers={"X-Cache": "HIT"})
+
+        if not await result.aexists():
+            return json_response(
+                {"result": f"No objects of the '{model_name}' model found"}, status=404
+            )
+
+        result = order_queryset(filter_queryset(result, request.query_params), ordering)
+
+        if stream_format in STREAM_CONTENT_TYPES:
+            return StreamingHttpResponse(
+                aiter_streamed_objects(result, stream_format, fields),
+                content_type=STREAM_CONTENT_TYPES[stream_format],
+            )
+
+        plan = entry.get_read_plan(fields)
+        rows = plan.values(result, ordering.lstrip("-"))
+        paginator = get_async_paginator(get_order_by(ordering))
+        page = await paginator.apaginate_queryset(rows, request)
+    except APIException as exc:
+        return api_exception_response(exc)
+
+    data = paginator.get_paginated_response(await plan.arender(page)).data
+    await sync_to_async(set_cached)(cache_key, data)
+    return json_response(data, headers={"X-Cache": "MISS"})
+
+
+@require_safe
+@async_conditional_get
+async def model_detail(request: HttpRequest, model_name: str, pk: int) -> HttpResponse:
+    """Async variant of ModelDetailAPIView, reading the row with aget()."""
+    request = Request(request)
+    entry = get_registry_entry(model_name)
+
+    if entry is None:
+        return json_response(
+            {"error": f"No model with name '{model_name}' was found"},
+            status=status.HTTP_404_NOT_FOUND,
+        )
+
+    try:
+        fields = get_requested_fields(request, model_name)
+    except APIException as exc:
+        return api_exception_response(exc)
+
+    cache_key, serialized_model = await sync_to_async(read_cached)(
+        get_detail_cache_key, entry.key, pk, fields
+    )
+    if serialized_model is not None:
+        return json_response(serialized_model, headers={"X-Cache": "HIT"})
 
-        object_class = result.first().__class__
-        model = get_object_or_404(object_class, id=pk)
+    plan = entry.get_read_plan(fields)
+    try:
+        row = await plan.values(entry.model.objects.filter(id=pk)).aget()
+    except ObjectDoesNotExist:
+        return json_response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
 
-        serialized_model: ReturnDict = get_deserialized_object(model)
-        return Response(serialized_model)
+    serialized_model = (await plan.arender([row]))[0]
+    await sync_to_async(set_cached)(cache_key, serialized_model)
+    return json_response(serialized_model, headers={"X-Cache": "MISS"})